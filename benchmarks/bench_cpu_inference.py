@@ -0,0 +1,99 @@
+"""
+So sánh độ trễ suy luận trên CPU giữa backend torch/fastpunct và ONNX Runtime:
+- VAD: độ trễ mỗi window 512 mẫu (16 kHz), đúng như RealTimeAudioProcessor gọi
+- Punctuation: độ trễ mỗi lần xử lý buffer (~20 từ, ngưỡng mặc định của PunctuationRestorer).
+  Backend onnx là model token classification khác hẳn FastPunct (seq2seq), nên đây là so sánh
+  giữa hai model chứ không phải cùng một model trên hai runtime.
+
+Ví dụ:
+    python -m benchmarks.bench_cpu_inference --vad-onnx models/silero_vad_int8.onnx \
+        --punct-onnx models/punct_vi --threads 1
+"""
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+from core.vad import VADDetector
+from core.punctuation import PunctuationRestorer
+
+SAMPLE_TEXT = ("hôm nay chúng ta họp để rà soát doanh thu quý ba và kế hoạch marketing "
+               "cho quý bốn anh nam sẽ trình bày số liệu trước sau đó chị lan cập nhật tiến độ dự án")
+
+
+def _summary(samples_ms):
+    samples_ms = sorted(samples_ms)
+    p = lambda q: samples_ms[min(len(samples_ms) - 1, int(q * len(samples_ms)))]
+    return {"mean": statistics.fmean(samples_ms), "p50": p(0.50), "p95": p(0.95), "p99": p(0.99)}
+
+
+def _time_calls(fn, inputs, warmup):
+    for x in inputs[:warmup]:
+        fn(x)
+    samples = []
+    for x in inputs[warmup:]:
+        start = time.perf_counter()
+        fn(x)
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summary(samples)
+
+
+def bench_vad(backend, onnx_path, threads, iterations, warmup):
+    vad = VADDetector(backend=backend, onnx_path=onnx_path, num_threads=threads)
+    if vad.model is None:
+        return None
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    rng = np.random.default_rng(0)
+    windows = [(rng.standard_normal(512) * 0.1).astype(np.float32) for _ in range(iterations + warmup)]
+    return _time_calls(lambda w: vad.is_speech(w, 16000), windows, warmup)
+
+
+def bench_punctuation(backend, model_dir, threads, iterations, warmup):
+    restorer = PunctuationRestorer(backend=backend, onnx_model_dir=model_dir, num_threads=threads)
+    if restorer.model is None:
+        return None
+    words = SAMPLE_TEXT.split()
+    buffers = [" ".join(words[i % 5:i % 5 + 20]) for i in range(iterations + warmup)]
+    return _time_calls(lambda text: restorer.model.punct([text]), buffers, warmup)
+
+
+def _print_row(name, stats):
+    if stats is None:
+        print(f"{name:<28} (không tải được model)")
+        return
+    print(f"{name:<28} {stats['mean']:>8.3f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark VAD / Punctuation: torch vs ONNX Runtime")
+    parser.add_argument("--vad-onnx", help="Model Silero VAD ONNX (vd: bản int8)")
+    parser.add_argument("--punct-onnx", help="Thư mục model Punctuation ONNX")
+    parser.add_argument("--threads", type=int, default=1, help="Số thread intra-op")
+    parser.add_argument("--vad-iterations", type=int, default=2000)
+    parser.add_argument("--punct-iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--skip-torch", action="store_true", help="Không chạy backend torch/fastpunct")
+    args = parser.parse_args(argv)
+
+    print(f"{'Backend (ms)':<28} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    if not args.skip_torch:
+        _print_row("VAD torch / window", bench_vad("torch", None, args.threads, args.vad_iterations, args.warmup))
+    if args.vad_onnx:
+        _print_row("VAD onnx / window", bench_vad("onnx", args.vad_onnx, args.threads, args.vad_iterations, args.warmup))
+    if not args.skip_torch:
+        _print_row("Punct fastpunct / buffer",
+                   bench_punctuation("fastpunct", None, args.threads, args.punct_iterations, args.warmup))
+    if args.punct_onnx:
+        _print_row("Punct onnx / buffer",
+                   bench_punctuation("onnx", args.punct_onnx, args.threads, args.punct_iterations, args.warmup))
+        print("\nLưu ý: Punct onnx là model token classification khác với FastPunct (seq2seq), "
+              "không phải FastPunct export sang ONNX; chênh lệch độ trễ và chất lượng là giữa hai model khác nhau.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Benchmark end-to-end pipeline xử lý file, chạy offline với mock OpenAI server:
+    Smart Splitting -> Diarization (tùy chọn) -> ASR -> Dấu câu -> Retrieval PDF -> Biên bản (LLM)
+
+Báo cáo: real-time factor, độ trễ p50/p90/p99 từng stage, số lần gọi API và bộ nhớ đỉnh.
+Audio mặc định là cuộc họp tổng hợp (seed cố định) nên kết quả lặp lại được giữa các lần chạy.
+
+Ví dụ:
+    python -m benchmarks.bench_pipeline --duration 600 --transcription-latency 0.4 --chat-latency 1.5
+    python -m benchmarks.bench_pipeline --audio meeting.wav --pdf tai_lieu.pdf --diarization --json before.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import tracemalloc
+
+from benchmarks.mock_openai import MockOpenAIServer, SCRIPT
+from benchmarks.synthetic import synthesize_meeting
+from core.asr import create_asr_service
+from core.audio_stream import probe_duration
+from core.config import get_secret, inference_config
+from core.file_processor import transcribe_file
+from core.pdf_processor import PDFKnowledgeBase, chunk_text
+from core.punctuation import PunctuationRestorer
+from core.rag_service import MeetingMinuteGenerator
+
+STAGES = ("segmentation", "diarization", "asr", "punctuation", "ingest", "retrieval", "minutes")
+
+
+class StageTimer:
+    """
+    Ghi độ trễ (ms) theo stage bằng cách bọc method trên instance.
+    """
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def wrap(self, obj, method, stage):
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[stage].append((time.perf_counter() - start) * 1000)
+
+        setattr(obj, method, timed)
+
+    def total_ms(self, stages):
+        return sum(sum(self.samples[s]) for s in stages)
+
+
+def _percentiles(samples_ms):
+    samples_ms = sorted(samples_ms)
+    p = lambda q: samples_ms[min(len(samples_ms) - 1, int(q * len(samples_ms)))]
+    return {"n": len(samples_ms), "p50": p(0.50), "p90": p(0.90), "p99": p(0.99),
+            "total_s": sum(samples_ms) / 1000}
+
+
+def _synthetic_agenda():
+    # Tài liệu tham khảo giả lập khi không có --pdf: các đoạn liên quan tới kịch bản mock
+    return "\n".join(f"Mục {i + 1}. {line.capitalize()}. Ghi chú bổ sung cho mục {i + 1}."
+                     for i, line in enumerate(SCRIPT * 5))
+
+
+def run_benchmark(audio_path, audio_seconds, server, asr_backend="openai", diarization=False,
+                  punct_backend="fastpunct", punct_onnx_dir=None, pdf_paths=None, minutes=True):
+    timer = StageTimer()
+    asr_cfg = dict(inference_config()["asr"], backend=asr_backend)
+    asr = create_asr_service(api_key="mock", base_url=server.url, **asr_cfg)
+    timer.wrap(asr, "predict", "asr")
+
+    diarizer = None
+    if diarization:
+        from core.diarization import OfflineDiarizer
+        diarizer = OfflineDiarizer(hf_token=get_secret("HF_TOKEN"))
+        timer.wrap(diarizer, "process_file", "diarization")
+
+    punctuator = PunctuationRestorer(backend=punct_backend, onnx_model_dir=punct_onnx_dir)
+    timer.wrap(punctuator, "add_text", "punctuation")
+    timer.wrap(punctuator, "flush", "punctuation")
+
+    # 1. Gỡ băng: thời gian còn lại của mỗi vòng (ngoài các stage đã bọc) là decode + Smart Splitting
+    inner = ("diarization", "asr", "punctuation")
+    records = []
+    start = time.perf_counter()
+    segments = transcribe_file(audio_path, asr, diarizer, punctuator=punctuator)
+    while True:
+        step_start, inner_before = time.perf_counter(), timer.total_ms(inner)
+        record = next(segments, None)
+        if record is None:
+            break
+        if record["type"] == "segment":
+            step_ms = (time.perf_counter() - step_start) * 1000
+            timer.samples["segmentation"].append(step_ms - (timer.total_ms(inner) - inner_before))
+        records.append(record)
+    transcribe_s = time.perf_counter() - start
+    entries = [r["entry"] for r in records if r.get("entry")]
+
+    # 2. Vector hóa tài liệu, truy vấn và tạo biên bản
+    minutes_s = 0.0
+    if minutes and entries:
+        with tempfile.TemporaryDirectory() as store:
+            pdf_kb = PDFKnowledgeBase(api_key="mock", collection_name="bench", persist_directory=store,
+                                      base_url=server.url)
+            if pdf_paths:
+                timer.wrap(pdf_kb, "process_and_store_pdf", "ingest")
+                for path in pdf_paths:
+                    pdf_kb.process_and_store_pdf(path)
+            else:
+                chunks = chunk_text(_synthetic_agenda(), pdf_kb.chunk_size, pdf_kb.chunk_overlap)
+                ingest_start = time.perf_counter()
+                pdf_kb.collection.upsert(
+                    documents=[c for c, _, _ in chunks],
+                    metadatas=[{"source": "synthetic", "page_number": 1, "chunk_index": i,
+                                "char_start": s, "char_end": e} for i, (_, s, e) in enumerate(chunks)],
+                    ids=[f"synthetic_page_1_chunk_{i}" for i in range(len(chunks))]
+                )
+                timer.samples["ingest"].append((time.perf_counter() - ingest_start) * 1000)
+
+            rag = MeetingMinuteGenerator(api_key="mock", base_url=server.url)
+            timer.wrap(pdf_kb, "find_relevant_pages", "retrieval")
+            timer.wrap(rag, "generate_minute_with_rag", "minutes")
+            start = time.perf_counter()
+            rag.generate_minutes(entries, pdf_kb=pdf_kb)
+            minutes_s = time.perf_counter() - start
+
+    return {
+        "audio_seconds": audio_seconds,
+        "segments": sum(1 for r in records if r["type"] == "segment"),
+        "entries": len(entries),
+        "transcribe_seconds": transcribe_s,
+        "minutes_seconds": minutes_s,
+        "rtf": transcribe_s / audio_seconds if audio_seconds else None,
+        "rtf_with_minutes": (transcribe_s + minutes_s) / audio_seconds if audio_seconds else None,
+        "stages": {stage: _percentiles(s) for stage, s in timer.samples.items() if s},
+        "api_calls": server.stats()
+    }
+
+
+def print_report(result):
+    print(f"\nAudio: {result['audio_seconds']:.1f}s | {result['segments']} đoạn | {result['entries']} câu")
+    print(f"Gỡ băng: {result['transcribe_seconds']:.2f}s  (RTF {result['rtf']:.3f})")
+    print(f"Biên bản: {result['minutes_seconds']:.2f}s  (RTF tổng {result['rtf_with_minutes']:.3f})\n")
+    print(f"{'Stage (ms)':<14} {'n':>6} {'p50':>10} {'p90':>10} {'p99':>10} {'total (s)':>10}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<14} {s['n']:>6} {s['p50']:>10.2f} {s['p90']:>10.2f} {s['p99']:>10.2f} {s['total_s']:>10.2f}")
+    calls = result["api_calls"]
+    print(f"\nAPI calls: " + ", ".join(f"{k}={v}" for k, v in calls["calls"].items())
+          + f" (embedded inputs={calls['embedded_inputs']})")
+    memory = result["memory"]
+    line = f"Peak RSS: {memory['peak_rss_mb']:.1f} MB"
+    if memory.get("tracemalloc_peak_mb") is not None:
+        line += f" | Python heap peak (tracemalloc): {memory['tracemalloc_peak_mb']:.1f} MB"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end pipeline với mock OpenAI server")
+    parser.add_argument("--audio", help="File ghi âm thật (mặc định: tạo audio tổng hợp)")
+    parser.add_argument("--duration", type=float, default=300, help="Độ dài audio tổng hợp (giây)")
+    parser.add_argument("--speakers", type=int, default=3, help="Số người nói trong audio tổng hợp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf", action="append", default=[], help="PDF tham khảo (mặc định: tài liệu tổng hợp)")
+    parser.add_argument("--diarization", action="store_true", help="Bật diarization (cần HF_TOKEN)")
+    parser.add_argument("--no-minutes", action="store_true", help="Chỉ đo phần gỡ băng")
+    parser.add_argument("--asr-backend", choices=["openai", "local"], default="openai")
+    parser.add_argument("--punct-backend", choices=["fastpunct", "onnx"], default="fastpunct")
+    parser.add_argument("--punct-onnx", help="Thư mục model Punctuation ONNX")
+    parser.add_argument("--transcription-latency", type=float, default=0.3, help="Độ trễ mock (giây)")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Đo thêm heap Python (chậm hơn)")
+    parser.add_argument("--verbose", action="store_true", help="Hiện log của pipeline")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        audio_path = args.audio
+        if audio_path:
+            audio_seconds = probe_duration(audio_path)
+        else:
+            audio_path = os.path.join(workdir, "meeting.wav")
+            audio_seconds = synthesize_meeting(audio_path, args.duration, num_speakers=args.speakers,
+                                               seed=args.seed)
+
+        latency = {"transcriptions": args.transcription_latency, "embeddings": args.embedding_latency,
+                   "chat": args.chat_latency}
+        if args.tracemalloc:
+            tracemalloc.start()
+        with MockOpenAIServer(latency=latency, jitter=args.jitter, seed=args.seed) as server:
+            log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with log_sink:
+                result = run_benchmark(audio_path, audio_seconds, server, asr_backend=args.asr_backend,
+                                       diarization=args.diarization, punct_backend=args.punct_backend,
+                                       punct_onnx_dir=args.punct_onnx, pdf_paths=args.pdf,
+                                       minutes=not args.no_minutes)
+
+    # ru_maxrss tính bằng KB trên Linux
+    result["memory"] = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    if args.tracemalloc:
+        result["memory"]["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
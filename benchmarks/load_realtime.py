@@ -0,0 +1,297 @@
+"""
+Load test cho tab Real-time: chạy N phiên RealTimeAudioProcessor song song trong một process
+(giống server Streamlit), mỗi phiên nhận frame av.AudioFrame 48 kHz stereo s16 (960 mẫu = 20 ms)
+đúng nhịp thời gian thực. VAD là VADDetector thật, ASR được thay bằng stub có độ trễ cấu hình được
+và đi qua RealtimePipeline như trong ứng dụng.
+
+Tăng dần số phiên và đo: độ trễ recv() mỗi frame, số frame trễ quá ngân sách 20 ms,
+độ sâu hàng đợi, CPU/bộ nhớ mỗi phiên, rồi báo số phiên tối đa còn đáp ứng được.
+
+Audio mặc định là cuộc họp tổng hợp theo formant (benchmarks/synthetic.py) mà Silero nhận là
+giọng nói; trước khi tải, script chạy thử VAD một phiên trên nguồn audio và dừng nếu không cắt
+được đoạn nào (khi đó ASR/pipeline không hề chịu tải). Mức không cắt được đoạn nào cũng bị coi
+là không hợp lệ. Dùng --audio với file ghi âm thật để sát thực tế hơn.
+
+Ví dụ:
+    python -m benchmarks.load_realtime --max-sessions 64 --level-seconds 20
+    python -m benchmarks.load_realtime --audio meeting.wav --vad onnx --vad-onnx models/silero_vad_int8.onnx
+"""
+import gc
+import os
+import sys
+import time
+import argparse
+import resource
+import threading
+
+import av
+import numpy as np
+
+from benchmarks.synthetic import synthetic_meeting_audio
+from core.asr import BaseASRService
+from core.audio_processor import RealTimeAudioProcessor
+from core.metrics import MetricsRegistry
+from core.pipeline import RealtimePipeline
+from core.vad import VADDetector
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960
+FRAME_SECONDS = FRAME_SAMPLES / SAMPLE_RATE  # 20 ms
+
+
+class StubASR(BaseASRService):
+    """
+    ASR giả: ngủ `latency` giây (+ `rtf` x độ dài audio) rồi trả về câu cố định.
+    Đi qua BaseASRService.predict nên vẫn có lọc ảo giác và metrics như backend thật.
+    """
+    name = "Stub ASR"
+    backend = "stub"
+
+    def __init__(self, latency=0.3, rtf=0.0):
+        super().__init__()
+        self.latency = latency
+        self.rtf = rtf
+
+    def _transcribe(self, audio_data, prompt):
+        time.sleep(self.latency + self.rtf * len(audio_data) / self.sample_rate)
+        return "hôm nay chúng ta họp để rà soát doanh thu quý ba", 0.99
+
+
+def _stub_punctuate(raw_text, force_flush=False):
+    # Mỗi phiên dùng hàm riêng thay cho singleton restore_punctuation (không chia sẻ buffer giữa các phiên)
+    return {"punctuated_text": raw_text}
+
+
+def make_frames(audio):
+    """
+    Cắt audio mono 48 kHz thành các av.AudioFrame s16 stereo 960 mẫu,
+    giống frame WebRTC (to_ndarray() có shape (1, 1920)).
+    """
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    pcm = np.pad(pcm, (0, -len(pcm) % FRAME_SAMPLES))
+    frames = []
+    for start in range(0, len(pcm), FRAME_SAMPLES):
+        interleaved = np.repeat(pcm[start:start + FRAME_SAMPLES], 2).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(interleaved, format="s16", layout="stereo")
+        frame.sample_rate = SAMPLE_RATE
+        frames.append(frame)
+    return frames
+
+
+def load_audio(path):
+    from core.audio_stream import stream_audio_blocks
+    return np.concatenate(list(stream_audio_blocks(path, sample_rate=SAMPLE_RATE)))
+
+
+def current_rss_mb():
+    # RSS hiện tại (Linux); nơi khác dùng RSS đỉnh
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    def __init__(self, index, frames, vad_kwargs, asr_latency, asr_rtf, asr_workers):
+        self.frames = frames
+        # Lệch pha giữa các phiên để các câu nói không cắt cùng lúc
+        self.offset = (index * 397) % len(frames)
+        self.registry = MetricsRegistry()
+        self.processor = RealTimeAudioProcessor(VADDetector(**vad_kwargs), registry=self.registry)
+        self.pipeline = RealtimePipeline(self.processor.output_queue, StubASR(asr_latency, asr_rtf),
+                                         punctuate=_stub_punctuate, pending_text=lambda: "",
+                                         num_workers=asr_workers, interim_queue=self.processor.interim_queue,
+                                         registry=self.registry)
+        self.latencies = []
+        self.dropped = 0
+        self.cpu_seconds = 0.0
+        self.max_backlog = 0
+        self.max_in_flight = 0
+        self.final_backlog = 0
+        self.results = 0
+
+    def drive(self, start_at, num_frames):
+        """
+        Gọi recv() theo lịch cố định 20 ms/frame (không trôi theo độ trễ).
+        Frame được tính là bị rớt nếu recv() xong sau hạn của khe thời gian của nó.
+        """
+        cpu_start = time.thread_time()
+        for k in range(num_frames):
+            scheduled = start_at + k * FRAME_SECONDS
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t0 = time.perf_counter()
+            self.processor.recv(self.frames[(self.offset + k) % len(self.frames)])
+            t1 = time.perf_counter()
+            self.latencies.append(t1 - t0)
+            if t1 > scheduled + FRAME_SECONDS:
+                self.dropped += 1
+        self.cpu_seconds = time.thread_time() - cpu_start
+
+    def sample(self):
+        backlog = self.processor.output_queue.qsize()
+        self.max_backlog = max(self.max_backlog, backlog)
+        self.max_in_flight = max(self.max_in_flight, self.pipeline.in_flight)
+        # Đóng vai UI: đọc hết kết quả để pipeline không bị backpressure từ hàng đợi results
+        while self.pipeline.get_result(timeout=0) is not None:
+            self.results += 1
+        return backlog
+
+
+def count_segments(frames, vad_kwargs):
+    """
+    Chạy VAD một phiên trên toàn bộ nguồn audio (không theo nhịp thời gian thực),
+    trả về số đoạn được cắt.
+    """
+    processor = RealTimeAudioProcessor(VADDetector(**vad_kwargs), registry=MetricsRegistry())
+    for frame in frames:
+        processor.recv(frame)
+    return processor.segment_id
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run_level(num_sessions, frames, args, vad_kwargs):
+    gc.collect()
+    rss_before = current_rss_mb()
+    sessions = [Session(i, frames, vad_kwargs, args.asr_latency, args.asr_rtf, args.asr_workers)
+                for i in range(num_sessions)]
+    rss_after_setup = current_rss_mb()
+    for s in sessions:
+        s.pipeline.start()
+
+    num_frames = int(args.level_seconds / FRAME_SECONDS)
+    start_at = time.perf_counter() + 0.2
+    drivers = [threading.Thread(target=s.drive, args=(start_at, num_frames), name=f"session-{i}", daemon=True)
+               for i, s in enumerate(sessions)]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for t in drivers:
+        t.start()
+
+    # Lấy mẫu độ sâu hàng đợi trong lúc chạy
+    while any(t.is_alive() for t in drivers):
+        for s in sessions:
+            s.sample()
+        time.sleep(args.sample_interval)
+    for t in drivers:
+        t.join()
+    cpu_used, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    for s in sessions:
+        s.final_backlog = s.sample()
+    rss_peak = current_rss_mb()
+
+    for s in sessions:
+        s.pipeline.stop()
+
+    latencies = [x for s in sessions for x in s.latencies]
+    total_frames = num_frames * num_sessions
+    dropped = sum(s.dropped for s in sessions)
+    result = {
+        "sessions": num_sessions,
+        "recv_p50_ms": _percentile(latencies, 0.50) * 1000,
+        "recv_p99_ms": _percentile(latencies, 0.99) * 1000,
+        "recv_max_ms": max(latencies) * 1000 if latencies else 0.0,
+        "dropped_ratio": dropped / total_frames if total_frames else 0.0,
+        "max_backlog": max(s.max_backlog for s in sessions),
+        "final_backlog": max(s.final_backlog for s in sessions),
+        "max_in_flight": max(s.max_in_flight for s in sessions),
+        "segments": sum(s.processor.segment_id for s in sessions),
+        "segments_dropped": sum(s.processor.dropped_segments for s in sessions),
+        "recv_cpu_pct_per_session": 100 * sum(s.cpu_seconds for s in sessions) / num_sessions / args.level_seconds,
+        "process_cores": cpu_used / wall if wall else 0.0,
+        "rss_per_session_mb": (rss_after_setup - rss_before) / num_sessions,
+        "rss_mb": rss_peak
+    }
+    # Không cắt được đoạn nào thì pipeline chưa hề được đo, không thể coi là đáp ứng được
+    result["sustainable"] = (result["segments"] > 0
+                             and result["segments_dropped"] == 0
+                             and result["dropped_ratio"] <= args.max_drop
+                             and result["recv_p99_ms"] <= FRAME_SECONDS * 1000
+                             and result["final_backlog"] <= args.max_backlog)
+    del sessions
+    return result
+
+
+def _print_row(r):
+    if not r["segments"]:
+        status = "KHÔNG CÓ ĐOẠN"
+    else:
+        status = "OK" if r["sustainable"] else "QUÁ TẢI"
+    print(f"{r['sessions']:>8} {r['recv_p50_ms']:>8.2f} {r['recv_p99_ms']:>8.2f} {r['recv_max_ms']:>8.1f} "
+          f"{r['dropped_ratio']:>7.2%} {r['max_backlog']:>7} {r['final_backlog']:>7} {r['segments']:>6} "
+          f"{r['recv_cpu_pct_per_session']:>8.1f} {r['process_cores']:>6.2f} "
+          f"{r['rss_per_session_mb']:>8.1f} {r['rss_mb']:>8.0f}  {status}")
+
+
+def session_levels(args):
+    if args.sessions:
+        return [int(x) for x in args.sessions.split(",")]
+    levels, n = [], args.start
+    while n <= args.max_sessions:
+        levels.append(n)
+        n *= 2
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test nhiều phiên Real-time đồng thời")
+    parser.add_argument("--sessions", help="Danh sách số phiên cần chạy, vd: 1,4,8,16")
+    parser.add_argument("--start", type=int, default=1, help="Số phiên ban đầu (nhân đôi mỗi mức)")
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--level-seconds", type=float, default=20, help="Thời gian chạy mỗi mức (giây)")
+    parser.add_argument("--audio", help="File ghi âm dùng làm nguồn (mặc định: audio tổng hợp)")
+    parser.add_argument("--vad", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--vad-onnx", help="Model Silero VAD ONNX khi --vad onnx")
+    parser.add_argument("--threads", type=int, default=1, help="Số thread intra-op của VAD")
+    parser.add_argument("--asr-latency", type=float, default=0.3, help="Độ trễ stub ASR mỗi request (giây)")
+    parser.add_argument("--asr-rtf", type=float, default=0.0, help="Độ trễ thêm theo độ dài audio (giây/giây)")
+    parser.add_argument("--asr-workers", type=int, default=2, help="Số ASR worker mỗi pipeline")
+    parser.add_argument("--max-drop", type=float, default=0.01, help="Tỉ lệ frame trễ tối đa chấp nhận được")
+    parser.add_argument("--max-backlog", type=int, default=2,
+                        help="Số đoạn tồn đọng tối đa trong output_queue khi kết thúc mức")
+    parser.add_argument("--sample-interval", type=float, default=0.25)
+    parser.add_argument("--keep-going", action="store_true", help="Chạy hết các mức kể cả khi đã quá tải")
+    args = parser.parse_args(argv)
+
+    if args.vad == "torch":
+        import torch
+        torch.set_num_threads(args.threads)
+    vad_kwargs = {"backend": args.vad, "onnx_path": args.vad_onnx, "num_threads": args.threads}
+
+    audio = load_audio(args.audio) if args.audio else synthetic_meeting_audio(60, sample_rate=SAMPLE_RATE)
+    frames = make_frames(audio)
+    source_segments = count_segments(frames, vad_kwargs)
+    print(f"Nguồn: {len(frames) * FRAME_SECONDS:.0f}s audio ({source_segments} đoạn), VAD={args.vad}, "
+          f"stub ASR {args.asr_latency}s, {os.cpu_count()} CPU\n")
+    if not source_segments:
+        print("VAD không cắt được đoạn nào trên nguồn audio (kiểm tra model VAD hoặc file --audio), "
+              "load test sẽ không tải ASR/pipeline.")
+        return 1
+    print(f"{'sessions':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'dropped':>7} {'backlog':>7} "
+          f"{'final':>7} {'segs':>6} {'cpu%/ss':>8} {'cores':>6} {'MB/ss':>8} {'RSS MB':>8}")
+
+    max_ok, segments = 0, 0
+    for n in session_levels(args):
+        result = run_level(n, frames, args, vad_kwargs)
+        _print_row(result)
+        segments += result["segments"]
+        if result["sustainable"]:
+            max_ok = max(max_ok, n)
+        elif not args.keep_going:
+            break
+
+    if not segments:
+        print("\nVAD không cắt được đoạn nào: ASR/pipeline chưa chịu tải nên không báo số phiên tối đa. "
+              "Hãy chạy lại với --audio <file ghi âm giọng nói thật>.")
+        return 1
+    print(f"\nSố phiên tối đa đáp ứng được (≤{args.max_drop:.0%} frame trễ, p99 recv ≤20 ms): {max_ok}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
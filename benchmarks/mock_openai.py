@@ -0,0 +1,225 @@
+"""
+Mock server tương thích OpenAI API để benchmark không cần mạng/quota:
+- POST /v1/audio/transcriptions  -> {"text": ...} (câu tiếng Việt lấy xoay vòng từ kịch bản)
+- POST /v1/embeddings            -> vector băm bag-of-words (cùng từ => vector gần nhau)
+- POST /v1/chat/completions      -> tóm tắt cố định
+- GET  /stats                    -> số lần gọi từng endpoint
+Độ trễ mỗi endpoint cấu hình được (giây, kèm jitter ngẫu nhiên theo seed).
+
+Ví dụ:
+    python -m benchmarks.mock_openai --port 8089 --transcription-latency 0.4 --chat-latency 1.5
+    # rồi trỏ client vào base_url="http://127.0.0.1:8089/v1"
+"""
+import re
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+EMBEDDING_DIM = 256
+
+SCRIPT = [
+    "hôm nay chúng ta họp để rà soát doanh thu quý ba",
+    "doanh thu tăng mười hai phần trăm so với cùng kỳ năm ngoái",
+    "chi phí marketing vượt ngân sách khoảng năm trăm triệu",
+    "đề nghị phòng tài chính gửi báo cáo chi tiết trước thứ sáu",
+    "tiến độ dự án chuyển đổi số đang chậm hai tuần",
+    "nhóm kỹ thuật cần thêm hai kỹ sư cho giai đoạn kiểm thử",
+    "kế hoạch quý bốn tập trung vào khách hàng doanh nghiệp",
+    "chúng ta sẽ chốt ngân sách trong cuộc họp tuần sau",
+]
+
+MINUTES_TEXT = (
+    "- **Nội dung chính:** Rà soát doanh thu, chi phí và tiến độ dự án.\n"
+    "- **Quyết định:** Chốt ngân sách quý bốn trong cuộc họp tuần sau.\n"
+    "- **Hành động:** Phòng tài chính gửi báo cáo chi tiết trước thứ sáu."
+)
+
+ENDPOINTS = ("transcriptions", "embeddings", "chat")
+
+
+def hash_embedding(text, dim=EMBEDDING_DIM):
+    """
+    Embedding tất định: mỗi từ băm vào một chiều, chuẩn hóa L2.
+    Đủ để truy vấn trong Chroma trả về đoạn có nhiều từ chung.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vec[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        norm = 1.0
+    return vec / norm
+
+
+class MockOpenAIServer:
+    """
+    Chạy mock server trong thread nền.
+
+    latency: dict {"transcriptions"|"embeddings"|"chat": giây}
+    jitter: tỉ lệ dao động ngẫu nhiên quanh latency (0.1 = ±10%)
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=None, jitter=0.1, seed=0):
+        self.latency = {"transcriptions": 0.3, "embeddings": 0.05, "chat": 1.0}
+        self.latency.update(latency or {})
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {name: 0 for name in ENDPOINTS}
+        self.embedded_inputs = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    self._send_json(server.stats())
+                else:
+                    self._send_json({"error": {"message": "not found"}}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                path = self.path.split("?")[0].rstrip("/")
+                if path.endswith("/audio/transcriptions"):
+                    self._send_json(server._transcription())
+                elif path.endswith("/embeddings"):
+                    self._send_json(server._embeddings(json.loads(body or b"{}")))
+                elif path.endswith("/chat/completions"):
+                    self._send_json(server._chat(json.loads(body or b"{}")))
+                elif path.endswith("/reset"):
+                    server.reset()
+                    self._send_json(server.stats())
+                else:
+                    self._send_json({"error": {"message": f"unsupported path {path}"}}, status=404)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "embedded_inputs": self.embedded_inputs}
+
+    def reset(self):
+        with self._lock:
+            self.calls = {name: 0 for name in ENDPOINTS}
+            self.embedded_inputs = 0
+
+    def _count_and_sleep(self, endpoint, extra=0):
+        with self._lock:
+            count = self.calls[endpoint]
+            self.calls[endpoint] += 1
+            self.embedded_inputs += extra
+            delay = self.latency[endpoint] * (1 + self._rng.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+        return count
+
+    def _transcription(self):
+        count = self._count_and_sleep("transcriptions")
+        return {"text": SCRIPT[count % len(SCRIPT)]}
+
+    def _embeddings(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self._count_and_sleep("embeddings", extra=len(inputs))
+        as_base64 = request.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vec = hash_embedding(text if isinstance(text, str) else " ".join(map(str, text)))
+            embedding = base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii") if as_base64 else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }
+
+    def _chat(self, request):
+        count = self._count_and_sleep("chat")
+        return {
+            "id": f"chatcmpl-mock-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": MINUTES_TEXT},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI API server cho benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--transcription-latency", type=float, default=0.3)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(args.host, args.port, jitter=args.jitter, latency={
+        "transcriptions": args.transcription_latency,
+        "embeddings": args.embedding_latency,
+        "chat": args.chat_latency
+    })
+    print(f"Mock OpenAI API: {server.url}  (Ctrl+C để dừng)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
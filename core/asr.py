@@ -0,0 +1,147 @@
+import re
+import abc
+import logging
+import numpy as np
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BaseASRService(abc.ABC):
+    """
+    Interface chung cho các backend ASR.
+
+    predict(audio, previous_text) -> dict:
+        {}                                   audio quá ngắn, bỏ qua
+        {"text": str, "confidence": float}   kết quả (text rỗng nếu bị lọc ảo giác)
+        {"error": str}                       backend lỗi
+    Backend con chỉ cần cài đặt _transcribe().
+    """
+    name = "ASR"
+    backend = "base"  # Nhãn backend trong metrics
+
+    def __init__(self):
+        self.sample_rate = 16000
+
+    def _is_hallucination(self, text):
+        """
+        Kiểm tra xem text có bị lỗi lặp từ (Whisper loop) không.
+        Ví dụ: "của quốc tế của quốc tế của quốc tế..."
+        """
+        if not text:
+            return True
+
+        # 1. Kiểm tra lặp ký tự vô nghĩa (vd: "cc cc cc", "g g g")
+        if re.search(r'\b(\w+)( \1){4,}', text): # Lặp lại 1 từ quá 4 lần
+            return True
+
+        # 2. Kiểm tra lặp cụm từ (vd: "cộng đồng quốc tế cộng đồng quốc tế...")
+        # Lấy 20 ký tự đầu, xem nó có lặp lại quá nhiều trong chuỗi không
+        if len(text) > 50:
+            prefix = text[:20]
+            if text.count(prefix) > 3:
+                return True
+
+        return False
+
+    @abc.abstractmethod
+    def _transcribe(self, audio_data, prompt):
+        """
+        Gỡ băng một đoạn audio 16 kHz. Trả về (text, confidence).
+        """
+
+    def predict(self, audio_data, previous_text=""):
+        """
+        previous_text: Ngữ cảnh câu trước để Whisper nối từ tốt hơn
+        """
+        try:
+            # Check độ dài audio, quá ngắn (<0.5s) thì bỏ qua để tránh hallucination
+            if len(audio_data) < self.sample_rate * 0.5:
+                metrics.inc("asr_skipped_total", backend=self.backend)
+                return {}
+
+            # Chỉ lấy 200 ký tự cuối làm prompt
+            metrics.inc("asr_requests_total", backend=self.backend)
+            with metrics.span("asr_latency_seconds", backend=self.backend):
+                text_result, confidence = self._transcribe(audio_data, previous_text[-200:] if previous_text else "")
+            text_result = text_result.strip()
+
+            # Lọc ảo giác
+            if self._is_hallucination(text_result):
+                metrics.inc("asr_hallucinations_filtered_total", backend=self.backend)
+                logger.warning(f"⚠️ [FILTERED] Phát hiện ảo giác: {text_result[:50]}...")
+                return {"text": "", "confidence": 0.0}
+
+            return {
+                "text": text_result,
+                "confidence": confidence
+            }
+
+        except Exception as e:
+            metrics.inc("asr_errors_total", backend=self.backend)
+            logger.error(f"❌ {self.name} Error: {e}")
+            # Trả về lỗi để phía gọi phân biệt với trường hợp audio quá ngắn
+            return {"error": str(e)}
+
+
+class LocalWhisperASRService(BaseASRService):
+    """
+    Whisper chạy cục bộ trên CPU bằng CTranslate2 (faster-whisper), mặc định int8.
+    Không cần mạng; throughput tăng theo số core (cpu_threads / num_workers).
+    """
+    name = "Local Whisper"
+    backend = "local"
+
+    def __init__(self, model="small", compute_type="int8", cpu_threads=0, num_workers=1,
+                 beam_size=1, language="vi"):
+        """
+        model: Tên model (tiny/base/small/medium/large-v3) hoặc thư mục model CTranslate2 đã convert
+        cpu_threads: Số thread cho mỗi lần gọi (0 = mặc định của CTranslate2)
+        num_workers: Số lần gọi predict có thể chạy song song (vd: nhiều ASR worker thread)
+        """
+        super().__init__()
+        if WhisperModel is None:
+            raise ImportError("Thư viện 'faster-whisper' chưa được cài đặt. Hãy chạy: pip install faster-whisper")
+        logger.info(f"Loading local Whisper '{model}' ({compute_type}, cpu_threads={cpu_threads}, workers={num_workers})")
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=num_workers)
+        self.beam_size = beam_size
+        self.language = language
+
+    def _transcribe(self, audio_data, prompt):
+        audio_data = np.asarray(audio_data, dtype=np.float32)
+        metrics.observe("asr_request_bytes", audio_data.nbytes, buckets=metrics.SIZE_BUCKETS, backend=self.backend)
+        segments, _ = self.model.transcribe(
+            audio_data,
+            language=self.language,
+            initial_prompt=prompt or None,
+            temperature=0.2, # Giống cấu hình gọi API
+            beam_size=self.beam_size,
+            condition_on_previous_text=False
+        )
+        segments = list(segments)
+        text = " ".join(s.text.strip() for s in segments)
+        # Độ tin cậy ~ xác suất trung bình mỗi token
+        confidence = float(np.exp(np.mean([s.avg_logprob for s in segments]))) if segments else 0.0
+        return text, confidence
+
+
+def create_asr_service(backend="openai", api_key=None, base_url=None, **kwargs):
+    """
+    Tạo ASR service theo backend:
+        'openai': Whisper API (cần api_key, base_url tùy chọn)
+        'local':  faster-whisper trên CPU (kwargs truyền cho LocalWhisperASRService)
+    Với 'openai', các kwargs của backend local được bỏ qua để có thể truyền thẳng
+    inference_config()["asr"].
+    """
+    if backend == "openai":
+        from core.openai_asr import OpenAIASRService
+        return OpenAIASRService(api_key=api_key, base_url=base_url)
+    if backend == "local":
+        return LocalWhisperASRService(**kwargs)
+    raise ValueError(f"Unknown ASR backend: {backend}")
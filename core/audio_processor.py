@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import av
 import queue
@@ -5,13 +6,27 @@ import logging
 import traceback
 from streamlit_webrtc import AudioProcessorBase
 
+from core import metrics
+
 logger = logging.getLogger(__name__)
 
 class RealTimeAudioProcessor(AudioProcessorBase):
-    def __init__(self, vad_model):
+    def __init__(self, vad_model, interim_interval=2.0, interim_window=10.0, registry=None,
+                 max_backlog=32):
+        """
+        interim_interval: Cứ mỗi N giây audio đang nói thì gửi bản nháp (None để tắt)
+        interim_window: Chỉ gửi N giây cuối của câu đang nói để giữ độ trễ ổn định
+        registry: MetricsRegistry của phiên (mặc định: registry toàn process)
+        max_backlog: Số câu tối đa chờ xử lý; khi đầy thì bỏ câu cũ nhất để bộ nhớ không tăng mãi
+        """
         self.vad_model = vad_model
+        self.registry = registry or metrics.REGISTRY
         self.buffer = np.array([], dtype=np.float32)
-        self.output_queue = queue.Queue()
+        # output_queue: (segment_id, audio) của các câu đã cắt xong
+        self.output_queue = queue.Queue(maxsize=max_backlog)
+        self.dropped_segments = 0
+        # interim_queue: chỉ giữ bản nháp mới nhất (segment_id, audio)
+        self.interim_queue = queue.Queue(maxsize=1)
         
         # Cấu hình VAD
         self.is_speaking = False
@@ -19,9 +34,20 @@ class RealTimeAudioProcessor(AudioProcessorBase):
         self.SILENCE_THRESHOLD = 10
         self.SPEECH_THRESHOLD = 0.5
         
+        # Cấu hình bản nháp (interim)
+        self.interim_samples = int(interim_interval * 16000) if interim_interval else None
+        self.interim_window_samples = int(interim_window * 16000)
+        self.last_interim_len = 0
+        self.segment_id = 0
+        
         self.frame_count = 0 
+        # Các hàm gọi khi kết nối WebRTC đóng (vd: dừng pipeline nền của phiên)
+        self._on_ended_callbacks = []
 
     def recv(self, frame: av.AudioFrame) -> av.AudioFrame:
+        # recv chạy trên thread của WebRTC, gắn registry của phiên trước khi đo
+        metrics.bind_registry(self.registry)
+        recv_start = time.perf_counter()
         try:
             # 1. Lấy dữ liệu và xử lý Shape (như cũ)
             raw = frame.to_ndarray() 
@@ -65,9 +91,10 @@ class RealTimeAudioProcessor(AudioProcessorBase):
 
             # Log
             self.frame_count += 1
+            metrics.inc("vad_frames_total", speech="true" if prob > self.SPEECH_THRESHOLD else "false")
             if self.frame_count % 30 == 0:
                 if prob > 0.5:
-                    print(f"🗣️ ĐANG NÓI (VAD={prob:.2f})")
+                    logger.debug(f"🗣️ ĐANG NÓI (VAD={prob:.2f})")
 
             # 5. Lưu vào Buffer (LƯU Ý: Lưu đủ 640 mẫu samples, KHÔNG lưu vad_input)
             self.buffer = np.concatenate((self.buffer, samples))
@@ -81,20 +108,81 @@ class RealTimeAudioProcessor(AudioProcessorBase):
                     self.silence_counter += 1
                     if self.silence_counter >= self.SILENCE_THRESHOLD:
                         self._cut_segment()
+            
+            # 7. Gửi bản nháp định kỳ khi câu nói kéo dài
+            if self.is_speaking and self.interim_samples:
+                if len(self.buffer) - self.last_interim_len >= self.interim_samples:
+                    self._emit_interim()
         
         except Exception as e:
             if self.frame_count % 50 == 0:
-                print(f"Error: {e}")
+                logger.error(f"Error: {e}")
                 # traceback.print_exc()
-            
+
+        metrics.observe("audio_recv_seconds", time.perf_counter() - recv_start)
         return frame
 
+    def add_on_ended(self, callback):
+        """
+        Đăng ký hàm được gọi khi trình duyệt ngắt kết nối hoặc bấm STOP.
+        """
+        self._on_ended_callbacks.append(callback)
+
+    def on_ended(self):
+        # streamlit-webrtc gọi hàm này trên thread của WebRTC khi track audio kết thúc
+        for callback in self._on_ended_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Lỗi khi dừng phiên realtime: {e}")
+        self._on_ended_callbacks = []
+
+    def _emit_interim(self):
+        window = self.buffer[-self.interim_window_samples:].copy()
+        self.last_interim_len = len(self.buffer)
+        # Bản nháp cũ chưa được xử lý thì bỏ đi, chỉ giữ bản mới nhất
+        try:
+            self.interim_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.interim_queue.put_nowait((self.segment_id, window))
+        except queue.Full:
+            pass
+
+    def _enqueue_segment(self, item):
+        # Xử lý phía sau không theo kịp: bỏ câu cũ nhất thay vì chặn thread WebRTC
+        while True:
+            try:
+                self.output_queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.output_queue.get_nowait()
+                self.dropped_segments += 1
+                metrics.inc("segments_dropped_total", source="realtime")
+                logger.warning("Hàng đợi audio đầy, bỏ đoạn cũ nhất")
+            except queue.Empty:
+                pass
+
+    @property
+    def backlog(self):
+        """
+        Số câu đã cắt đang chờ pipeline lấy ra.
+        """
+        return self.output_queue.qsize()
+
     def _cut_segment(self):
         if len(self.buffer) > 8000:
             segment = self.buffer.copy()
-            self.output_queue.put(segment)
-            print(f"CẮT AUDIO ({len(segment)/16000:.2f}s)")
+            self._enqueue_segment((self.segment_id, segment))
+            self.segment_id += 1
+            metrics.inc("segments_total", source="realtime")
+            metrics.observe("segment_duration_seconds", len(segment) / 16000, buckets=metrics.DURATION_BUCKETS)
+            logger.info(f"CẮT AUDIO ({len(segment)/16000:.2f}s)")
         
         self.buffer = np.array([], dtype=np.float32)
         self.is_speaking = False
-        self.silence_counter = 0
\ No newline at end of file
+        self.silence_counter = 0
+        self.last_interim_len = 0
\ No newline at end of file
@@ -0,0 +1,140 @@
+import av
+import logging
+import librosa
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def probe_duration(source):
+    """
+    Đọc thời lượng (giây) từ header của file mà không cần giải mã. Trả về None nếu không rõ.
+    """
+    container = av.open(source)
+    try:
+        if container.duration is not None:
+            return container.duration / av.time_base
+        stream = container.streams.audio[0]
+        if stream.duration is not None and stream.time_base is not None:
+            return float(stream.duration * stream.time_base)
+        return None
+    finally:
+        container.close()
+
+
+def stream_audio_blocks(source, sample_rate=16000, block_seconds=5.0):
+    """
+    Giải mã file audio theo từng khối bằng PyAV, resample dần về mono float32.
+    Mỗi lần yield một khối ~block_seconds giây, bộ nhớ không phụ thuộc độ dài file.
+
+    Args:
+        source: Đường dẫn hoặc file-like object (vd: UploadedFile của Streamlit)
+    """
+    block_size = int(block_seconds * sample_rate)
+    container = av.open(source)
+    try:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+
+        pending = []
+        pending_len = 0
+
+        def _collect(frames):
+            nonlocal pending_len
+            for out in frames:
+                samples = out.to_ndarray().reshape(-1).astype(np.float32, copy=False)
+                pending.append(samples)
+                pending_len += len(samples)
+
+        for frame in container.decode(stream):
+            _collect(resampler.resample(frame))
+            if pending_len >= block_size:
+                yield np.concatenate(pending)
+                pending, pending_len = [], 0
+
+        # Xả phần còn lại trong resampler
+        _collect(resampler.resample(None))
+        if pending:
+            yield np.concatenate(pending)
+    finally:
+        container.close()
+
+
+def stream_segments(blocks, sample_rate=16000, top_db=25, frame_length=2048, hop_length=512,
+                    window_seconds=30.0, max_segment_seconds=30.0, start_sample=0, state=None):
+    """
+    Smart Splitting dạng streaming: cắt bỏ khoảng lặng trên từng cửa sổ audio
+    thay vì trên toàn bộ file.
+
+    Đoạn nói còn dang dở ở cuối cửa sổ được giữ lại để ghép với khối kế tiếp;
+    nếu dài quá max_segment_seconds thì bị cắt cưỡng bức. Mức tham chiếu dB là
+    năng lượng lớn nhất đã gặp tính đến thời điểm hiện tại (librosa.load + split
+    dùng max của toàn file).
+
+    start_sample: Bỏ qua phần audio trước vị trí này (dùng khi xử lý tiếp từ checkpoint).
+    state: Dict trạng thái dùng chung với phía gọi: state["ref_power"] là mức tham chiếu hiện
+        tại, được cập nhật liên tục để lưu vào checkpoint. Khi xử lý tiếp, truyền lại giá trị
+        đã lưu để ngưỡng khoảng lặng giống hệt lần chạy không bị ngắt; nếu không có
+        (checkpoint cũ) thì mức tham chiếu được tính lại trên phần audio bị bỏ qua.
+
+    Yields:
+        (start_sample, end_sample, audio) với offset tính trên toàn file.
+    """
+    window_samples = int(window_seconds * sample_rate)
+    max_segment_samples = int(max_segment_seconds * sample_rate)
+
+    state = {} if state is None else state
+    restored = state.get("ref_power") is not None
+    state["ref_power"] = state.get("ref_power") or 0.0
+
+    def _running_ref(power):
+        state["ref_power"] = max(state["ref_power"], float(np.max(power)) if power.size else 0.0)
+        return state["ref_power"]
+
+    def _split(y):
+        return librosa.effects.split(y, top_db=top_db, ref=_running_ref,
+                                     frame_length=frame_length, hop_length=hop_length)
+
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_offset = 0  # Vị trí (sample) của buffer[0] trong file
+    skip = start_sample
+
+    for block in blocks:
+        if skip:
+            if not restored:
+                _running_ref(librosa.feature.rms(y=block[:skip], frame_length=frame_length,
+                                                 hop_length=hop_length) ** 2)
+            if len(block) <= skip:
+                skip -= len(block)
+                buffer_offset += len(block)
+                continue
+            block = block[skip:]
+            buffer_offset += skip
+            skip = 0
+
+        buffer = np.concatenate((buffer, block))
+        if len(buffer) < window_samples:
+            continue
+
+        intervals = _split(buffer)
+        carry_start = max(len(buffer) - frame_length, 0)
+        last_emitted_end = 0
+
+        for idx, (start, end) in enumerate(intervals):
+            is_open = idx == len(intervals) - 1 and end >= len(buffer) - hop_length
+            if is_open and len(buffer) - start < max_segment_samples:
+                # Đoạn nói chưa kết thúc -> giữ lại chờ khối sau
+                carry_start = start
+                break
+            yield buffer_offset + start, buffer_offset + end, buffer[start:end].copy()
+            last_emitted_end = end
+        else:
+            carry_start = max(carry_start, last_emitted_end)
+
+        buffer = buffer[carry_start:]
+        buffer_offset += carry_start
+
+    # Hết file: xả toàn bộ phần còn lại
+    if len(buffer):
+        for start, end in _split(buffer):
+            yield buffer_offset + start, buffer_offset + end, buffer[start:end].copy()
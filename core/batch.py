@@ -0,0 +1,261 @@
+"""
+Xử lý hàng loạt file ghi âm không cần giao diện Streamlit.
+
+Ví dụ:
+    python -m core.batch recordings/ -o outputs/ --pdf tai_lieu.pdf --minutes
+"""
+import os
+import sys
+import json
+import argparse
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.config import get_secret, inference_config
+from core.checkpoint import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+
+# Services được khởi tạo một lần cho mỗi process worker
+_services = {}
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def find_recordings(input_path):
+    if os.path.isfile(input_path):
+        return [input_path]
+    paths = []
+    for root, _, files in os.walk(input_path):
+        for name in files:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def output_names(recordings):
+    """
+    Tên đầu ra cho từng file: đường dẫn tương đối so với thư mục gốc chung, giữ cả
+    phần mở rộng (vd: "a/meeting.wav"), để a/meeting.wav, b/meeting.wav và
+    meeting.mp3 không ghi đè kết quả của nhau.
+    """
+    paths = [os.path.abspath(p) for p in recordings]
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return {rec: os.path.relpath(p, root) for rec, p in zip(recordings, paths)}
+
+
+def _init_worker(config):
+    """
+    Khởi tạo model/client trong từng process (không chia sẻ được giữa các process).
+    """
+    from core.asr import create_asr_service
+    from core.rag_service import MeetingMinuteGenerator
+    from core.pdf_processor import PDFKnowledgeBase
+    from core.punctuation import get_punctuation_restorer
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(message)s')
+
+    asr_config = dict(config["asr"])
+    if not asr_config.get("cpu_threads"):
+        # Local Whisper: chia đều số core cho các process
+        asr_config["cpu_threads"] = max(1, available_cpus() // config["workers"])
+    _services["asr"] = create_asr_service(api_key=config["api_key"], **asr_config)
+    _services["diarizer"] = None
+    if config["hf_token"] and config["diarization"]:
+        import torch
+        from core.diarization import OfflineDiarizer
+        # Chia đều số core cho các process, tránh oversubscription
+        torch.set_num_threads(max(1, available_cpus() // config["workers"]))
+        _services["diarizer"] = OfflineDiarizer(hf_token=config["hf_token"])
+    _services["diarization"] = dict(config["diarization_windows"])
+    if not _services["diarization"]["num_workers"]:
+        _services["diarization"]["num_workers"] = max(1, available_cpus() // config["workers"])
+
+    _services["rag"] = MeetingMinuteGenerator(api_key=config["api_key"]) if config["minutes"] else None
+    _services["pdf_kb"] = None
+    if config["minutes"] and config["collection"]:
+        _services["pdf_kb"] = PDFKnowledgeBase(api_key=config["api_key"], collection_name=config["collection"],
+                                               persist_directory=config["vector_store"])
+    _services["punctuator"] = get_punctuation_restorer(**inference_config()["punctuation"])
+
+
+def process_recording(audio_path, output_dir, minutes=False, name=None, job_id=None):
+    """
+    Gỡ băng một file (có checkpoint, chạy lại sẽ xử lý tiếp) và ghi kết quả ra output_dir:
+        <name>.transcript.json, <name>.txt và <name>.minutes.md (nếu bật minutes)
+    name: Tên đầu ra (mặc định: tên file kèm phần mở rộng), có thể chứa thư mục con
+    """
+    from core.file_processor import long_file_speakers, transcribe_file
+
+    stem = os.path.join(output_dir, name or os.path.basename(audio_path))
+    os.makedirs(os.path.dirname(stem), exist_ok=True)
+    if job_id is None:
+        with open(audio_path, "rb") as f:
+            job_id = JobCheckpoint.job_id_for(f)
+    checkpoint = JobCheckpoint(job_id, directory=os.path.join(output_dir, ".checkpoints"))
+
+    speaker_segments = None
+    if not checkpoint.completed:
+        speaker_segments = long_file_speakers(audio_path, _services["diarizer"], _services["diarization"],
+                                              checkpoint=checkpoint)
+    for _ in transcribe_file(audio_path, _services["asr"], _services["diarizer"],
+                             checkpoint=checkpoint, punctuator=_services["punctuator"].new_buffer(),
+                             speaker_segments=speaker_segments):
+        pass
+
+    entries = checkpoint.entries()
+    transcript_path = f"{stem}.transcript.json"
+    with open(transcript_path, "w", encoding="utf-8") as f:
+        json.dump({"source": audio_path, "entries": entries, "segments": checkpoint.segments},
+                  f, ensure_ascii=False, indent=2)
+    with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(f"{e['speaker']}: {e['text']}" for e in entries) + "\n")
+
+    result = {"source": audio_path, "transcript": transcript_path, "entries": len(entries)}
+    if minutes and _services["rag"] and entries:
+        summary = _services["rag"].generate_minutes(entries, pdf_kb=_services["pdf_kb"])
+        minutes_path = f"{stem}.minutes.md"
+        with open(minutes_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        result["minutes"] = minutes_path
+    return result
+
+
+def _run_one(audio_path, output_dir, minutes, name, job_id):
+    # Bọc lỗi để một file hỏng không làm dừng cả batch
+    try:
+        return process_recording(audio_path, output_dir, minutes=minutes, name=name, job_id=job_id)
+    except Exception as e:
+        logger.error(f"Lỗi xử lý {audio_path}: {e}")
+        return {"source": audio_path, "error": str(e)}
+
+
+def ingest_pdfs(pdf_paths, api_key, vector_store):
+    """
+    Vector hóa tài liệu PDF một lần trong process chính, trả về tên collection dùng chung.
+    """
+    from core.pdf_processor import PDFKnowledgeBase
+
+    digest = hashlib.sha1("|".join(sorted(os.path.abspath(p) for p in pdf_paths)).encode("utf-8"))
+    collection = f"batch_{digest.hexdigest()[:12]}"
+    pdf_kb = PDFKnowledgeBase(api_key=api_key, collection_name=collection, persist_directory=vector_store)
+    for path in pdf_paths:
+        pdf_kb.process_and_store_pdf(path)
+    return collection
+
+
+def run_batch(recordings, output_dir, api_key, hf_token=None, workers=None, minutes=False,
+              pdf_paths=None, diarization=True, vector_store="./storage/vector_store", asr_backend=None,
+              windowed_diarization=None):
+    """
+    Entry point dạng hàm: xử lý song song danh sách file bằng process pool.
+
+    windowed_diarization: File dài ít nhất N giây dùng diarization theo cửa sổ
+    (mặc định: DIARIZATION_WINDOWED_MIN_SECONDS, 0 = tắt)
+
+    Returns:
+        List kết quả theo từng file (có key "error" nếu file đó lỗi,
+        "duplicate_of" nếu trùng nội dung với một file khác nên không xử lý lại).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = output_names(recordings)
+
+    # File trùng nội dung dùng chung một checkpoint -> chỉ xử lý một lần
+    unique, results = {}, []
+    for path in recordings:
+        with open(path, "rb") as f:
+            job_id = JobCheckpoint.job_id_for(f)
+        if job_id in unique:
+            logger.info(f"⏭️ {path} trùng nội dung với {unique[job_id]}, bỏ qua")
+            results.append({"source": path, "duplicate_of": unique[job_id]})
+        else:
+            unique[job_id] = path
+
+    workers = workers or available_cpus()
+    workers = max(1, min(workers, len(unique)))
+
+    collection = None
+    if minutes and pdf_paths:
+        collection = ingest_pdfs(pdf_paths, api_key, vector_store)
+
+    infer_cfg = inference_config()
+    asr_config = infer_cfg["asr"]
+    if asr_backend:
+        asr_config["backend"] = asr_backend
+    diarization_windows = infer_cfg["diarization"]
+    if windowed_diarization is not None:
+        diarization_windows["windowed_min_seconds"] = windowed_diarization
+
+    config = {
+        "api_key": api_key,
+        "asr": asr_config,
+        "hf_token": hf_token,
+        "diarization": diarization,
+        "diarization_windows": diarization_windows,
+        "minutes": minutes,
+        "collection": collection,
+        "vector_store": vector_store,
+        "workers": workers
+    }
+
+    logger.info(f"Batch: {len(unique)} file, {workers} process")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+        futures = {pool.submit(_run_one, path, output_dir, minutes, names[path], job_id): path
+                   for job_id, path in unique.items()}
+        for future in as_completed(futures):
+            result = future.result()
+            status = "❌" if "error" in result else "✅"
+            logger.info(f"{status} {result['source']}")
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gỡ băng và tạo biên bản hàng loạt cho các file ghi âm.")
+    parser.add_argument("input", help="File hoặc thư mục chứa file ghi âm")
+    parser.add_argument("-o", "--output", default="./outputs", help="Thư mục ghi kết quả")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Số process (mặc định: số core)")
+    parser.add_argument("--minutes", action="store_true", help="Tạo biên bản (RAG) cho từng file")
+    parser.add_argument("--pdf", action="append", default=[], help="Tài liệu PDF tham khảo (có thể lặp lại)")
+    parser.add_argument("--no-diarization", action="store_true", help="Bỏ qua nhận diện người nói")
+    parser.add_argument("--asr-backend", choices=["openai", "local"], default=None,
+                        help="Backend ASR (mặc định: ASR_BACKEND trong cấu hình)")
+    parser.add_argument("--windowed-diarization", type=float, default=None, metavar="SECONDS",
+                        help="Diarization theo cửa sổ song song cho file dài ít nhất N giây "
+                             "(mặc định: DIARIZATION_WINDOWED_MIN_SECONDS, 0 = tắt)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    api_key = get_secret("OPENAI_API_KEY")
+    asr_backend = args.asr_backend or inference_config()["asr"]["backend"]
+    # Backend local không cần API key, trừ khi phải tạo biên bản
+    if not api_key and (asr_backend == "openai" or args.minutes):
+        logger.error("Chưa cấu hình OPENAI_API_KEY (biến môi trường hoặc .streamlit/secrets.toml)")
+        return 1
+
+    recordings = find_recordings(args.input)
+    if not recordings:
+        logger.error(f"Không tìm thấy file ghi âm trong {args.input}")
+        return 1
+
+    results = run_batch(recordings, args.output, api_key, hf_token=get_secret("HF_TOKEN"),
+                        workers=args.workers, minutes=args.minutes, pdf_paths=args.pdf,
+                        diarization=not args.no_diarization, asr_backend=asr_backend,
+                        windowed_diarization=args.windowed_diarization)
+    failed = [r for r in results if "error" in r]
+    logger.info(f"Hoàn tất: {len(results) - len(failed)}/{len(results)} file thành công")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
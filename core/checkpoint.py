@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobCheckpoint:
+    """
+    Log append-only (JSONL) cho một job xử lý file audio.
+
+    Mỗi đoạn xử lý xong được ghi ngay một dòng:
+        {"type": "segment", "index", "start", "end", "speaker", "raw_text",
+         "prompt_context", "entry", "pending_text", "ref_power"}
+    và khi xử lý hết file thì ghi thêm:
+        {"type": "done", "entry"}
+
+    "entry" là câu đã thêm dấu câu được đưa vào transcript (hoặc None nếu text
+    còn nằm trong buffer dấu câu, khi đó buffer được lưu ở "pending_text").
+    Nhờ vậy có thể xử lý tiếp từ đoạn cuối cùng hoặc đọc lại transcript mà
+    không phải gọi lại API.
+    """
+
+    def __init__(self, job_id, directory="./storage/jobs"):
+        self.job_id = job_id
+        self.directory = directory
+        self.path = os.path.join(directory, f"{job_id}.jsonl")
+        self.speakers_path = os.path.join(directory, f"{job_id}.speakers.json")
+        self._records = None
+        self._offset = 0
+        self._tail_repaired = False
+
+    @staticmethod
+    def job_id_for(fileobj, **settings):
+        """
+        Tạo job_id ổn định từ nội dung file (và các cấu hình ảnh hưởng đến kết quả).
+        """
+        digest = hashlib.sha1()
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(1 << 20), b""):
+            digest.update(block)
+        fileobj.seek(0)
+        if settings:
+            digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    # --- Đọc ---
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = self._load()
+        return self._records
+
+    def _load(self):
+        self._offset = 0
+        return self._read_new()
+
+    def _read_new(self):
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                # Dòng cuối có thể đang được ghi dở (process khác) hoặc bị cắt khi process bị kill
+                if not raw.endswith(b"\n"):
+                    break
+                self._offset += len(raw)
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"Bỏ qua dòng checkpoint hỏng trong {self.path}")
+                    continue
+                records.append(record)
+        return records
+
+    def refresh(self):
+        """
+        Đọc thêm các record mới được process khác (vd: job worker) ghi vào log.
+        Chỉ đọc phần mới từ vị trí lần trước, trả về list record mới.
+        """
+        if self._records is None:
+            return self.records
+        new_records = self._read_new()
+        self._records.extend(new_records)
+        return new_records
+
+    def exists(self):
+        return bool(self.records)
+
+    @property
+    def completed(self):
+        return any(r["type"] == "done" for r in self.records)
+
+    @property
+    def segments(self):
+        return [r for r in self.records if r["type"] == "segment"]
+
+    def entries(self):
+        """Các câu transcript đã có (dùng để hiển thị lại mà không cần tính toán)."""
+        return [r["entry"] for r in self.records if r.get("entry")]
+
+    def resume_state(self):
+        """
+        Trạng thái để xử lý tiếp: vị trí sample, index đoạn kế tiếp, ngữ cảnh prompt
+        cho Whisper, text đang chờ thêm dấu câu và mức tham chiếu dB của Smart Splitting
+        (None với checkpoint cũ chưa lưu giá trị này).
+        """
+        segments = self.segments
+        if not segments:
+            return {"start_sample": 0, "next_index": 0, "prompt_context": "", "pending_text": "", "ref_power": None}
+        last = segments[-1]
+        return {
+            "start_sample": last["end"],
+            "next_index": last["index"] + 1,
+            "prompt_context": last["raw_text"] or last["prompt_context"],
+            "pending_text": last["pending_text"],
+            "ref_power": last.get("ref_power")
+        }
+
+    def load_speakers(self):
+        """
+        Kết quả diarization cả file đã lưu (list speaker segment), None nếu chưa có.
+        """
+        if not os.path.exists(self.speakers_path):
+            return None
+        try:
+            with open(self.speakers_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            logger.warning(f"Bỏ qua file diarization hỏng {self.speakers_path}")
+            return None
+
+    # --- Ghi ---
+    def append(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        records = self.records
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            if not self._tail_repaired:
+                self._repair_tail(f)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        records.append(record)
+        self._offset += len(line)
+
+    def _repair_tail(self, f):
+        """
+        Lần ghi đầu tiên: cắt bỏ dòng cuối ghi dở (process trước bị kill giữa chừng),
+        nếu không record mới sẽ bị dính vào dòng hỏng và không bao giờ đọc lại được.
+        """
+        self.refresh()
+        if f.seek(0, os.SEEK_END) > self._offset:
+            logger.warning(f"Cắt bỏ dòng checkpoint ghi dở cuối {self.path}")
+            f.truncate(self._offset)
+        self._tail_repaired = True
+
+    def save_speakers(self, speaker_segments):
+        """
+        Lưu kết quả diarization cả file để lần chạy tiếp (resume) không phải tính lại.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.speakers_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(speaker_segments, f, ensure_ascii=False)
+        os.replace(tmp_path, self.speakers_path)
+
+    def reset(self):
+        for path in (self.path, self.speakers_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._records = []
+        self._offset = 0
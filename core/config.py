@@ -0,0 +1,69 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+
+def get_secret(name, default=None, secrets_path=SECRETS_PATH):
+    """
+    Đọc cấu hình cho các entry point không chạy qua Streamlit (CLI, worker):
+    ưu tiên biến môi trường, sau đó đến file .streamlit/secrets.toml.
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+
+    if os.path.exists(secrets_path):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                logger.warning("Không đọc được secrets.toml (cần Python 3.11+ hoặc thư viện tomli)")
+                return default
+        with open(secrets_path, "rb") as f:
+            return tomllib.load(f).get(name, default)
+
+    return default
+
+
+def inference_config():
+    """
+    Cấu hình backend suy luận trên CPU cho VAD, Punctuation và ASR:
+        VAD_BACKEND = "onnx", VAD_ONNX_PATH = "models/silero_vad_int8.onnx"
+        PUNCT_BACKEND = "onnx", PUNCT_ONNX_DIR = "models/punct_vi"
+        ONNX_THREADS = 1
+        ASR_BACKEND = "local", LOCAL_WHISPER_MODEL = "small", LOCAL_WHISPER_COMPUTE_TYPE = "int8"
+        ASR_CPU_THREADS = 0, ASR_NUM_WORKERS = 1
+        DIARIZATION_WINDOWED_MIN_SECONDS = 1800 (0 = tắt), DIARIZATION_WINDOW_SECONDS = 300,
+        DIARIZATION_OVERLAP_SECONDS = 30, DIARIZATION_WORKERS = 0 (0 = số core)
+    """
+    threads = int(get_secret("ONNX_THREADS", 1))
+    return {
+        "asr": {
+            "backend": get_secret("ASR_BACKEND", "openai"),
+            "model": get_secret("LOCAL_WHISPER_MODEL", "small"),
+            "compute_type": get_secret("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+            "cpu_threads": int(get_secret("ASR_CPU_THREADS", 0)),
+            "num_workers": int(get_secret("ASR_NUM_WORKERS", 1))
+        },
+        "vad": {
+            "backend": get_secret("VAD_BACKEND", "torch"),
+            "onnx_path": get_secret("VAD_ONNX_PATH"),
+            "num_threads": threads
+        },
+        "punctuation": {
+            "backend": get_secret("PUNCT_BACKEND", "fastpunct"),
+            "onnx_model_dir": get_secret("PUNCT_ONNX_DIR"),
+            "num_threads": threads
+        },
+        "diarization": {
+            "windowed_min_seconds": float(get_secret("DIARIZATION_WINDOWED_MIN_SECONDS", 0)),
+            "window_seconds": float(get_secret("DIARIZATION_WINDOW_SECONDS", 300)),
+            "overlap_seconds": float(get_secret("DIARIZATION_OVERLAP_SECONDS", 30)),
+            "num_workers": int(get_secret("DIARIZATION_WORKERS", 0))
+        }
+    }
@@ -1,8 +1,15 @@
+import os
 import torch
 import logging
+import threading
 import torchaudio
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pyannote.audio import Pipeline
 
+from core.audio_stream import stream_audio_blocks
+
 # --- CẤU HÌNH ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,9 +20,28 @@ try:
 except:
     pass
 
+def _extract_annotation(result_obj):
+    """
+    Lấy Annotation từ output của pipeline (định dạng khác nhau giữa các phiên bản pyannote).
+    """
+    # Kiểm tra xem object có thuộc tính 'speaker_diarization' không (như trong log bạn gửi)
+    if hasattr(result_obj, 'speaker_diarization'):
+        return result_obj.speaker_diarization
+    # Fallback cho các trường hợp khác (bản cũ/mới hơn)
+    if hasattr(result_obj, 'itertracks'):
+        return result_obj
+    if isinstance(result_obj, tuple):
+        return result_obj[0]
+    if hasattr(result_obj, 'annotation'):
+        return result_obj.annotation
+    return None
+
 class OfflineDiarizer:
     def __init__(self, hf_token: str):
+        self.hf_token = hf_token
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # Pipeline pyannote không an toàn khi gọi đồng thời (vd: nhiều ASR worker thread)
+        self._lock = threading.Lock()
         logger.info(f"Initiating Diarization Pipeline on device: {self.device}")
         
         try:
@@ -52,23 +78,12 @@ class OfflineDiarizer:
 
             # 2. Chạy Inference
             input_data = {"waveform": waveform, "sample_rate": sample_rate}
-            result_obj = self.pipeline(input_data)
+            with self._lock:
+                result_obj = self.pipeline(input_data)
             
             # --- FIX CHÍNH XÁC CHO LỖI CỦA BẠN ---
-            diarization = None
-            
-            # Kiểm tra xem object có thuộc tính 'speaker_diarization' không (như trong log bạn gửi)
-            if hasattr(result_obj, 'speaker_diarization'):
-                diarization = result_obj.speaker_diarization
-                
-            # Fallback cho các trường hợp khác (bản cũ/mới hơn)
-            elif hasattr(result_obj, 'itertracks'):
-                diarization = result_obj
-            elif isinstance(result_obj, tuple):
-                diarization = result_obj[0]
-            elif hasattr(result_obj, 'annotation'):
-                diarization = result_obj.annotation
-            else:
+            diarization = _extract_annotation(result_obj)
+            if diarization is None:
                 logger.error(f"⚠️ Unknown output type: {type(result_obj)}")
                 return {"speaker_segments": [], "error": f"Unknown output format: {type(result_obj)}"}
 
@@ -97,6 +112,231 @@ class OfflineDiarizer:
             traceback.print_exc()
             return {"speaker_segments": [], "error": str(e)}
 
+    def process_file_windowed(self, audio_path: str, window_seconds: float = 300.0, overlap_seconds: float = 30.0,
+                              num_workers: int = None, similarity_threshold: float = 0.5) -> dict:
+        """
+        Diarization cho file rất dài: chia file thành các cửa sổ chồng lấn, chạy
+        song song trên nhiều process (mỗi process một pipeline), sau đó ghép nhãn
+        người nói giữa các cửa sổ theo độ tương đồng cosine của speaker embedding.
+
+        File được giải mã dần bằng PyAV (đọc được cả mp3/m4a) và chỉ giữ một số ít
+        cửa sổ đang xử lý, nên bộ nhớ không tăng theo độ dài file. Kết quả cùng định
+        dạng với process_file().
+        """
+        if overlap_seconds * 2 >= window_seconds:
+            raise ValueError("overlap_seconds phải nhỏ hơn một nửa window_seconds")
+
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        num_workers = num_workers or cpus
+        threads_per_worker = max(1, cpus // num_workers)
+
+        logger.info(f"Starting windowed diarization for: {audio_path} "
+                    f"(window={window_seconds}s, overlap={overlap_seconds}s, workers={num_workers})")
+
+        try:
+            sample_rate = 16000
+            window = int(window_seconds * sample_rate)
+            step = window - int(overlap_seconds * sample_rate)
+
+            ctx = multiprocessing.get_context("spawn")
+            results = []
+            num_windows, total_frames = 0, 0
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx, initializer=_init_window_worker,
+                                     initargs=(self.hf_token, threads_per_worker)) as pool:
+                in_flight = set()
+                for idx, (start, samples) in enumerate(_iter_windows(audio_path, sample_rate, window, step)):
+                    # Giới hạn số cửa sổ nằm trong RAM cùng lúc
+                    while len(in_flight) >= num_workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        results.extend(fut.result() for fut in done)
+                    in_flight.add(pool.submit(_diarize_window, idx, start / sample_rate, samples, sample_rate))
+                    num_windows = idx + 1
+                    total_frames = start + len(samples)
+
+                done, _ = wait(in_flight)
+                results.extend(fut.result() for fut in done)
+
+            speaker_segments = _stitch_windows(sorted(results, key=lambda r: r["index"]), window_seconds,
+                                               overlap_seconds, total_frames / sample_rate, similarity_threshold)
+            result = {
+                "speaker_segments": speaker_segments,
+                "total_speakers": len(set(s['speaker'] for s in speaker_segments))
+            }
+            logger.info(f"Windowed diarization finished. {num_windows} windows, found {result['total_speakers']} speakers.")
+            return result
+
+        except Exception as e:
+            logger.error(f"Error during windowed diarization: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return {"speaker_segments": [], "error": str(e)}
+
+def _iter_windows(audio_path, sample_rate, window, step):
+    """
+    Giải mã file theo luồng (mono, sample_rate) và cắt thành các cửa sổ dài `window`
+    mẫu, cách nhau `step` mẫu. Cửa sổ cuối có thể ngắn hơn; phần đuôi đã nằm trọn
+    trong vùng chồng lấn của cửa sổ trước thì bỏ qua.
+
+    Yields:
+        (start_sample, samples)
+    """
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0  # Vị trí (sample) của buffer[0] trong file
+    emitted = False
+    for block in stream_audio_blocks(audio_path, sample_rate=sample_rate):
+        buffer = np.concatenate((buffer, block))
+        while len(buffer) >= window:
+            yield offset, buffer[:window].copy()
+            emitted = True
+            buffer = buffer[step:]
+            offset += step
+    if len(buffer) and (not emitted or len(buffer) > window - step):
+        yield offset, buffer
+
+# --- WINDOWED DIARIZATION (chạy trong process con) ---
+_window_pipeline = None
+
+def _init_window_worker(hf_token, num_threads):
+    global _window_pipeline
+    torch.set_num_threads(num_threads)
+    _window_pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", token=hf_token)
+    _window_pipeline.to(torch.device("cpu"))
+
+def _diarize_window(index, offset, samples, sample_rate):
+    """
+    Diarization một cửa sổ. Trả về segment (thời gian tuyệt đối) và embedding
+    trung bình của từng người nói cục bộ để ghép nhãn giữa các cửa sổ.
+    """
+    waveform = torch.from_numpy(np.ascontiguousarray(samples)).unsqueeze(0)
+    input_data = {"waveform": waveform, "sample_rate": sample_rate}
+
+    embeddings = None
+    try:
+        result_obj = _window_pipeline(input_data, return_embeddings=True)
+        if isinstance(result_obj, tuple) and len(result_obj) == 2:
+            embeddings = result_obj[1]
+    except TypeError:
+        # Bản pyannote không hỗ trợ return_embeddings
+        result_obj = _window_pipeline(input_data)
+
+    diarization = _extract_annotation(result_obj)
+    labels = list(diarization.labels()) if diarization is not None else []
+    segments = []
+    if diarization is not None:
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            segments.append({"speaker": speaker, "start": turn.start + offset, "end": turn.end + offset})
+
+    vectors = {}
+    if embeddings is not None:
+        for label, vec in zip(labels, np.asarray(embeddings)):
+            if np.all(np.isfinite(vec)):
+                vectors[label] = vec.tolist()
+    else:
+        logger.warning(f"Window {index}: không có speaker embedding, nhãn sẽ không được ghép giữa các cửa sổ")
+
+    return {"index": index, "offset": offset, "duration": len(samples) / sample_rate,
+            "segments": segments, "embeddings": vectors}
+
+def _stitch_windows(results, window_seconds, overlap_seconds, total_duration, similarity_threshold):
+    """
+    Ghép nhãn cục bộ của các cửa sổ thành nhãn toàn cục.
+    - Mỗi người nói cục bộ được gán cho centroid toàn cục giống nhất (cosine >= ngưỡng),
+      hai người nói trong cùng cửa sổ không được gán chung một nhãn.
+    - Người nói không ghép được bằng embedding (vd: cửa sổ không có embedding) được
+      ghép theo thời gian nói trùng với cửa sổ trước trong vùng chồng lấn.
+    - Mỗi cửa sổ chỉ giữ phần giữa vùng chồng lấn để tránh trùng segment.
+    """
+    centroids = []  # List vector tổng (chưa chuẩn hóa) của từng người nói toàn cục
+    half_overlap = overlap_seconds / 2
+    stitched = []
+    previous, previous_end = [], 0.0  # Segment của cửa sổ trước (kèm nhãn toàn cục) và thời điểm kết thúc
+
+    for pos, res in enumerate(results):
+        mapping = {}
+        used = set()
+        labelled = []
+        # Người nói có embedding được ghép trước, theo thứ tự tổng thời lượng giảm dần
+        local_labels = sorted({s["speaker"] for s in res["segments"]},
+                              key=lambda l: -sum(s["end"] - s["start"] for s in res["segments"] if s["speaker"] == l))
+        for label in local_labels:
+            vec = res["embeddings"].get(label)
+            best, best_sim = None, similarity_threshold
+            if vec is not None:
+                vec = np.asarray(vec)
+                vec = vec / (np.linalg.norm(vec) + 1e-9)
+                for g, centroid in enumerate(centroids):
+                    if g in used or centroid.shape != vec.shape:
+                        continue
+                    sim = float(np.dot(vec, centroid / (np.linalg.norm(centroid) + 1e-9)))
+                    if sim >= best_sim:
+                        best, best_sim = g, sim
+            if best is None:
+                best = _match_by_overlap(label, res, previous, previous_end, used)
+            if best is None:
+                centroids.append(np.zeros_like(vec) if vec is not None else np.zeros(1))
+                best = len(centroids) - 1
+            if vec is not None:
+                if centroids[best].shape == vec.shape:
+                    centroids[best] = centroids[best] + vec
+                elif not centroids[best].any():
+                    # Người nói này trước đó chưa có embedding
+                    centroids[best] = vec
+            used.add(best)
+            mapping[label] = best
+
+        # Vùng thời gian cửa sổ này "sở hữu"
+        own_start = res["offset"] + (half_overlap if pos > 0 else 0.0)
+        own_end = res["offset"] + res["duration"] - (half_overlap if pos < len(results) - 1 else 0.0)
+        for s in res["segments"]:
+            start, end = max(s["start"], own_start), min(s["end"], own_end, total_duration)
+            if end > start:
+                stitched.append({"speaker": f"SPEAKER_{mapping[s['speaker']]:02d}", "start": start, "end": end})
+            labelled.append({"global": mapping[s["speaker"]], "start": s["start"], "end": s["end"]})
+        previous, previous_end = labelled, res["offset"] + res["duration"]
+
+    # Gộp các segment liền nhau của cùng người nói (bị cắt tại biên cửa sổ)
+    stitched.sort(key=lambda s: s["start"])
+    merged = []
+    for s in stitched:
+        if merged and merged[-1]["speaker"] == s["speaker"] and s["start"] - merged[-1]["end"] <= 0.05:
+            merged[-1]["end"] = max(merged[-1]["end"], s["end"])
+        else:
+            merged.append(dict(s))
+    for s in merged:
+        s["start"], s["end"] = round(s["start"], 3), round(s["end"], 3)
+    return merged
+
+def _match_by_overlap(label, res, previous, previous_end, used, min_ratio=0.5):
+    """
+    Ghép người nói cục bộ `label` với người nói toàn cục của cửa sổ trước dựa trên thời
+    gian nói trùng nhau trong vùng chồng lấn (cùng một đoạn audio được diarize hai lần).
+    Trả về chỉ số người nói toàn cục, hoặc None nếu phần trùng dưới min_ratio thời
+    gian nói của `label` trong vùng đó.
+    """
+    region_start, region_end = res["offset"], previous_end
+    if not previous or region_end <= region_start:
+        return None
+
+    own = [(max(s["start"], region_start), min(s["end"], region_end))
+           for s in res["segments"] if s["speaker"] == label]
+    own = [(a, b) for a, b in own if b > a]
+    spoken = sum(b - a for a, b in own)
+    if spoken <= 0:
+        return None
+
+    shared = {}
+    for p in previous:
+        if p["global"] in used:
+            continue
+        for a, b in own:
+            inter = min(b, p["end"]) - max(a, p["start"])
+            if inter > 0:
+                shared[p["global"]] = shared.get(p["global"], 0.0) + inter
+    if not shared:
+        return None
+    best = max(shared, key=shared.get)
+    return best if shared[best] >= min_ratio * spoken else None
+
 def diarize_segment(audio_path: str, hf_token: str) -> dict:
     diarizer = OfflineDiarizer(hf_token)
     return diarizer.process_file(audio_path)
\ No newline at end of file
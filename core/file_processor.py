@@ -0,0 +1,147 @@
+import logging
+
+from core import metrics
+from core.audio_stream import probe_duration, stream_audio_blocks, stream_segments
+from core.pipeline import detect_speaker, dominant_speaker
+from core.punctuation import get_punctuation_restorer
+
+logger = logging.getLogger(__name__)
+
+
+class ASRRequestError(RuntimeError):
+    """ASR trả lỗi giữa chừng; đoạn hiện tại chưa được ghi vào checkpoint."""
+
+
+def long_file_speakers(audio_path, diarizer, window_config, checkpoint=None):
+    """
+    Diarization theo cửa sổ cho cả file (OfflineDiarizer.process_file_windowed) thay vì
+    từng đoạn, chỉ bật khi file dài ít nhất window_config["windowed_min_seconds"] giây
+    (0 = tắt). Kết quả được lưu cạnh checkpoint để lần chạy tiếp không phải tính lại.
+
+    window_config: inference_config()["diarization"]
+
+    Returns:
+        List speaker segment (giây, tính trên toàn file) để truyền cho transcribe_file,
+        hoặc None nếu không dùng (khi đó diarization chạy trên từng đoạn như cũ).
+    """
+    min_seconds = window_config.get("windowed_min_seconds") or 0
+    if diarizer is None or min_seconds <= 0:
+        return None
+    if checkpoint is not None:
+        cached = checkpoint.load_speakers()
+        if cached is not None:
+            return cached
+
+    duration = probe_duration(audio_path)
+    if duration is None or duration < min_seconds:
+        return None
+    result = diarizer.process_file_windowed(
+        audio_path, window_seconds=window_config["window_seconds"],
+        overlap_seconds=window_config["overlap_seconds"], num_workers=window_config.get("num_workers") or None
+    )
+    if "error" in result:
+        logger.warning(f"Windowed diarization lỗi, chuyển sang diarization từng đoạn: {result['error']}")
+        return None
+    if checkpoint is not None:
+        checkpoint.save_speakers(result["speaker_segments"])
+    return result["speaker_segments"]
+
+
+def transcribe_file(source, asr_model, diarizer=None, checkpoint=None, punctuator=None,
+                    sample_rate=16000, min_duration=0.5, speaker_segments=None):
+    """
+    Xử lý file audio theo luồng: streaming decode -> Smart Splitting ->
+    diarization -> ASR (kèm ngữ cảnh câu trước) -> dấu câu.
+
+    punctuator: Restorer riêng của job này (buffer sẽ bị ghi đè khi resume). Mặc định tạo
+    buffer riêng trên model dùng chung, không đụng tới buffer của singleton.
+
+    speaker_segments: Kết quả diarization cả file (xem long_file_speakers); nếu có thì
+    người nói của mỗi đoạn được tra theo thời gian thay vì chạy diarizer trên từng đoạn.
+
+    Nếu có checkpoint, mỗi đoạn xử lý xong được ghi ngay vào log và lần chạy sau
+    sẽ bắt đầu từ sau đoạn cuối cùng đã ghi (kể cả buffer dấu câu và prompt).
+
+    Yields:
+        Record của từng đoạn mới xử lý (cùng định dạng với JobCheckpoint), và
+        cuối cùng là record {"type": "done"}.
+
+    Raises:
+        ASRRequestError: nếu API ASR lỗi; gọi lại hàm để xử lý tiếp.
+    """
+    punctuator = punctuator or get_punctuation_restorer().new_buffer()
+
+    state = {"start_sample": 0, "next_index": 0, "prompt_context": "", "pending_text": "", "ref_power": None}
+    if checkpoint is not None:
+        if checkpoint.completed:
+            return
+        state = checkpoint.resume_state()
+        if state["next_index"]:
+            logger.info(f"Resume job from segment {state['next_index']} ({state['start_sample'] / sample_rate:.1f}s)")
+
+    # Khôi phục buffer dấu câu của lần chạy trước
+    punctuator.buffer = state["pending_text"]
+    previous_context = state["prompt_context"]
+    index = state["next_index"]
+
+    blocks = stream_audio_blocks(source, sample_rate=sample_rate)
+    # Mức tham chiếu dB của Smart Splitting được lưu theo từng đoạn để resume cắt giống lần chạy liền mạch
+    split_state = {"ref_power": state["ref_power"]}
+    segments = stream_segments(blocks, sample_rate=sample_rate, start_sample=state["start_sample"],
+                               state=split_state)
+
+    for start, end, chunk in segments:
+        # Nếu đoạn quá ngắn (< 0.5s) thì bỏ qua
+        if (end - start) / sample_rate < min_duration:
+            continue
+        metrics.inc("segments_total", source="file")
+        metrics.observe("segment_duration_seconds", (end - start) / sample_rate, buckets=metrics.DURATION_BUCKETS)
+
+        # A. Diarization
+        if speaker_segments is not None:
+            speaker = dominant_speaker(speaker_segments, start / sample_rate, end / sample_rate)
+        else:
+            speaker = detect_speaker(diarizer, chunk, sample_rate)
+
+        # B. ASR kèm ngữ cảnh câu trước
+        raw_text = ""
+        if asr_model:
+            res = asr_model.predict(chunk, previous_text=previous_context)
+            if "error" in res:
+                raise ASRRequestError(res["error"])
+            raw_text = res.get('text', '').strip()
+
+        # C. Dấu câu
+        entry = None
+        if raw_text:
+            punct = punctuator.add_text(raw_text)
+            if punct:
+                entry = {"speaker": speaker, "text": punct['punctuated_text']}
+
+        record = {
+            "type": "segment",
+            "index": index,
+            "start": int(start),
+            "end": int(end),
+            "speaker": speaker,
+            "raw_text": raw_text,
+            "prompt_context": previous_context,
+            "entry": entry,
+            "pending_text": punctuator.buffer,
+            "ref_power": split_state["ref_power"]
+        }
+        if checkpoint is not None:
+            checkpoint.append(record)
+        yield record
+
+        index += 1
+        if raw_text:
+            # Cập nhật context cho vòng lặp sau
+            previous_context = raw_text
+
+    # Flush cuối cùng
+    flush = punctuator.flush()
+    done = {"type": "done", "entry": {"speaker": "End", "text": flush['punctuated_text']} if flush else None}
+    if checkpoint is not None:
+        checkpoint.append(done)
+    yield done
@@ -0,0 +1,483 @@
+"""
+Hàng đợi job cục bộ để tách xử lý nặng (gỡ băng file, vector hóa PDF, tạo biên bản)
+ra khỏi process Streamlit.
+
+Trạng thái job được lưu trong SQLite nên không mất khi trình duyệt tải lại trang;
+worker chạy ở process riêng:
+    python -m core.jobs worker --processes 2
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import contextlib
+import argparse
+import logging
+import threading
+import multiprocessing
+
+from core import metrics
+from core.config import get_secret, inference_config
+from core.checkpoint import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL DEFAULT 0,
+    message TEXT DEFAULT '',
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL,
+    owner TEXT,
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    run_after REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+
+# Cột thêm sau phiên bản đầu, bổ sung vào file SQLite cũ khi mở
+_MIGRATIONS = {
+    "owner": "TEXT",
+    "attempts": "INTEGER DEFAULT 0",
+    "max_attempts": "INTEGER DEFAULT 3",
+    "run_after": "REAL"
+}
+
+
+class JobQueue:
+    """
+    API submit / status / result trên một file SQLite dùng chung giữa UI và các worker.
+    """
+
+    def __init__(self, db_path="./storage/jobs/queue.db", upload_dir="./storage/uploads", retry_delay=30):
+        """
+        retry_delay: Số giây chờ trước lần thử lại thứ n (nhân với n) khi job lỗi
+        """
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.retry_delay = retry_delay
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, decl in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {decl}")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # --- API cho UI ---
+    def store_upload(self, fileobj, filename):
+        """Lưu file upload ra đĩa để worker (process khác) đọc được."""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex[:8]}_{os.path.basename(filename)}")
+        fileobj.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f)
+        fileobj.seek(0)
+        return path
+
+    def submit_upload(self, kind, payload, fileobj, filename, path_key, dedupe_key=None, owner=None):
+        """
+        Như submit, nhưng chỉ lưu file upload (vào payload[path_key]) khi thực sự tạo job mới.
+        File được xóa khi job xong hoặc lỗi hẳn (hết lượt thử lại, xem remove_uploads).
+        """
+        if dedupe_key:
+            job_id = self.find_active(kind, dedupe_key)
+            if job_id:
+                return job_id
+        path = self.store_upload(fileobj, filename)
+        job_id = self.submit(kind, dict(payload, **{path_key: path}), dedupe_key=dedupe_key, owner=owner)
+        if self.status(job_id)["payload"].get(path_key) != path:
+            # Process khác vừa tạo job trùng, file vừa lưu không còn ai dùng
+            os.remove(path)
+        return job_id
+
+    def find_active(self, kind, dedupe_key):
+        """ID job cùng kind + dedupe_key đang chờ/chạy, hoặc None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN (?, ?)",
+                (kind, dedupe_key, QUEUED, RUNNING)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def remove_uploads(self, job):
+        """Xóa các file trong upload_dir mà payload của job tham chiếu tới."""
+        upload_dir = os.path.abspath(self.upload_dir)
+        for value in job["payload"].values():
+            if not isinstance(value, str):
+                continue
+            path = os.path.abspath(value)
+            if os.path.dirname(path) == upload_dir and os.path.isfile(path):
+                os.remove(path)
+
+    def latest(self, owner, kind):
+        """Job mới nhất của owner (vd: phiên Streamlit) theo kind, hoặc None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE owner = ? AND kind = ? ORDER BY created_at DESC LIMIT 1", (owner, kind)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def submit(self, kind, payload, dedupe_key=None, owner=None, max_attempts=3):
+        """
+        Thêm job vào hàng đợi. Nếu đã có job cùng kind + dedupe_key đang chờ/chạy
+        thì trả về job đó thay vì tạo mới.
+
+        owner: Ai gửi job (vd: session id), để UI tìm lại job sau khi tải lại trang
+        max_attempts: Số lần chạy tối đa; job lỗi được đưa lại hàng đợi cho tới khi hết lượt
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedupe_key:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN (?, ?)",
+                    (kind, dedupe_key, QUEUED, RUNNING)
+                ).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return row["id"]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, created_at, owner, max_attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, dedupe_key, json.dumps(payload, ensure_ascii=False), QUEUED, time.time(),
+                 owner, max_attempts)
+            )
+            conn.execute("COMMIT")
+        logger.info(f"Submitted job {job_id} ({kind})")
+        return job_id
+
+    def status(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def result(self, job_id):
+        """Trả về kết quả nếu job đã xong, ngược lại None."""
+        job = self.status(job_id)
+        if job and job["status"] == DONE:
+            return job["result"]
+        return None
+
+    def list_jobs(self, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    # --- API cho worker ---
+    def claim(self, worker_id):
+        """Lấy job cũ nhất đang chờ và đã tới lượt chạy (atomic giữa nhiều worker)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND (run_after IS NULL OR run_after <= ?) "
+                "ORDER BY created_at LIMIT 1", (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        job = self._to_dict(row)
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def update_progress(self, job_id, progress, message=""):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ?, message = ?, heartbeat = ? WHERE id = ?",
+                         (progress, message, time.time(), job_id))
+
+    def complete(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, progress = 1, result = ?, finished_at = ? WHERE id = ?",
+                         (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id, error, retry=True):
+        """
+        Ghi lỗi của lần chạy vừa rồi. Nếu còn lượt (attempts < max_attempts) và retry=True thì
+        đưa job lại hàng đợi sau retry_delay x attempts giây (job gỡ băng chạy tiếp từ checkpoint),
+        ngược lại đánh dấu lỗi hẳn.
+
+        Returns:
+            True nếu job đã lỗi hẳn (không chạy lại nữa).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if retry and row is not None and row["attempts"] < row["max_attempts"]:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, worker = NULL, run_after = ?, message = ? WHERE id = ?",
+                    (QUEUED, error, now + self.retry_delay * row["attempts"],
+                     f"Lỗi lần {row['attempts']}/{row['max_attempts']}, sẽ thử lại: {error}", job_id)
+                )
+                conn.execute("COMMIT")
+                logger.warning(f"Job {job_id} failed (attempt {row['attempts']}/{row['max_attempts']}), requeued")
+                return False
+            conn.execute("UPDATE jobs SET status = ?, error = ?, message = ?, finished_at = ? WHERE id = ?",
+                         (FAILED, error, f"Lỗi: {error}", now, job_id))
+            conn.execute("COMMIT")
+        return True
+
+    def requeue_stale(self, timeout=600):
+        """
+        Đưa các job 'running' không còn heartbeat (worker chết) về hàng đợi.
+        Job gỡ băng sẽ tiếp tục từ checkpoint. Job đã hết lượt chạy thì đánh dấu lỗi hẳn
+        (và xóa file upload), tránh một job làm chết worker lặp lại mãi.
+        """
+        now = time.time()
+        requeued, exhausted = 0, []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, attempts, max_attempts FROM jobs WHERE status = ? AND heartbeat < ?",
+                                (RUNNING, now - timeout)).fetchall()
+            for row in rows:
+                if row["attempts"] < row["max_attempts"]:
+                    conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, row["id"]))
+                    requeued += 1
+                else:
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                 (FAILED, "Worker ngừng hoạt động giữa chừng (hết lượt thử lại)", now, row["id"]))
+                    exhausted.append(row["id"])
+            conn.execute("COMMIT")
+        for job_id in exhausted:
+            self.remove_uploads(self.status(job_id))
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale jobs")
+        return requeued
+
+
+class JobWorker:
+    """
+    Worker chạy các job bằng pipeline trong core/. Services được khởi tạo lazy
+    một lần cho mỗi process.
+    """
+
+    def __init__(self, job_queue, api_key, hf_token=None, vector_store="./storage/vector_store",
+                 checkpoint_dir="./storage/jobs", heartbeat_interval=30):
+        self.queue = job_queue
+        self.heartbeat_interval = heartbeat_interval
+        self.api_key = api_key
+        self.hf_token = hf_token
+        self.vector_store = vector_store
+        self.checkpoint_dir = checkpoint_dir
+        self.worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'local'}-{os.getpid()}"
+        self._services = {}
+        self.handlers = {
+            "transcribe": self._run_transcribe,
+            "ingest_pdf": self._run_ingest_pdf,
+            "minutes": self._run_minutes
+        }
+
+    def _service(self, name):
+        if name not in self._services:
+            if name == "asr":
+                from core.asr import create_asr_service
+                from core.config import inference_config
+                self._services[name] = create_asr_service(api_key=self.api_key, **inference_config()["asr"])
+            elif name == "diarizer":
+                from core.diarization import OfflineDiarizer
+                self._services[name] = OfflineDiarizer(hf_token=self.hf_token) if self.hf_token else None
+            elif name == "rag":
+                from core.rag_service import MeetingMinuteGenerator
+                self._services[name] = MeetingMinuteGenerator(api_key=self.api_key)
+        return self._services[name]
+
+    def _pdf_kb(self, collection):
+        from core.pdf_processor import PDFKnowledgeBase
+        return PDFKnowledgeBase(api_key=self.api_key, collection_name=collection,
+                                persist_directory=self.vector_store)
+
+    # --- Handlers ---
+    def _run_transcribe(self, job):
+        from core.audio_stream import probe_duration
+        from core.file_processor import long_file_speakers, transcribe_file
+        from core.punctuation import get_punctuation_restorer
+
+        payload = job["payload"]
+        audio_path = payload["audio_path"]
+        checkpoint = JobCheckpoint(payload["checkpoint_id"], directory=self.checkpoint_dir)
+        total_duration = probe_duration(audio_path)
+
+        infer_cfg = inference_config()
+        diarizer = self._service("diarizer")
+        speaker_segments = None
+        if not checkpoint.completed:
+            speaker_segments = long_file_speakers(audio_path, diarizer, infer_cfg["diarization"],
+                                                  checkpoint=checkpoint)
+
+        punctuator = get_punctuation_restorer(**infer_cfg["punctuation"]).new_buffer()
+        for record in transcribe_file(audio_path, self._service("asr"), diarizer, checkpoint=checkpoint,
+                                      punctuator=punctuator, speaker_segments=speaker_segments):
+            if record["type"] == "segment":
+                # Cập nhật tiến độ sau mỗi đoạn (đồng thời là heartbeat của job)
+                position = record["end"] / 16000
+                progress = min(position / total_duration, 0.99) if total_duration else 0.0
+                self.queue.update_progress(job["id"], progress,
+                                           f"Đã xử lý đoạn {record['index'] + 1} ({position:.0f}s)")
+        return {"checkpoint_id": checkpoint.job_id, "entries": checkpoint.entries()}
+
+    def _run_ingest_pdf(self, job):
+        payload = job["payload"]
+        self._pdf_kb(payload["collection"]).process_and_store_pdf(payload["pdf_path"])
+        return {"collection": payload["collection"], "pdf_name": payload.get("pdf_name")}
+
+    def _run_minutes(self, job):
+        payload = job["payload"]
+        pdf_kb = self._pdf_kb(payload["collection"]) if payload.get("collection") else None
+        summary = self._service("rag").generate_minutes(
+            payload["entries"], pdf_kb=pdf_kb,
+            progress_callback=lambda done, total: self.queue.update_progress(job["id"], done / total,
+                                                                              f"Phần {done}/{total}")
+        )
+        return {"summary": summary}
+
+    # --- Vòng lặp ---
+    def run_job(self, job):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job["id"], f"Unknown job kind: {job['kind']}", retry=False)
+            self.queue.remove_uploads(job)
+            return
+        logger.info(f"[{self.worker_id}] Running job {job['id']} ({job['kind']})")
+        start = time.perf_counter()
+        # Heartbeat định kỳ trong lúc handler chạy (vector hóa PDF, gọi LLM, một đoạn ASR dài...)
+        # để requeue_stale không chạy lại job vẫn còn sống
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(job["id"], stop_heartbeat), daemon=True)
+        heartbeat.start()
+        # File upload chỉ bị xóa khi job xong hoặc lỗi hẳn; job còn lượt thử lại cần file để chạy tiếp
+        finished = False
+        try:
+            self.queue.complete(job["id"], handler(job))
+            finished = True
+            metrics.inc("jobs_total", kind=job["kind"], status=DONE)
+            logger.info(f"[{self.worker_id}] Job {job['id']} done")
+        except Exception as e:
+            metrics.inc("jobs_total", kind=job["kind"], status=FAILED)
+            logger.error(f"[{self.worker_id}] Job {job['id']} failed: {e}")
+            finished = self.queue.fail(job["id"], str(e))
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+            if finished:
+                self.queue.remove_uploads(job)
+            metrics.observe("job_seconds", time.perf_counter() - start, kind=job["kind"])
+
+    def _heartbeat_loop(self, job_id, stop_event):
+        while not stop_event.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(job_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat error for job {job_id}: {e}")
+
+    def run_forever(self, poll_interval=1.0, stale_timeout=600):
+        logger.info(f"Worker {self.worker_id} started")
+        while True:
+            self.queue.requeue_stale(stale_timeout)
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            self.run_job(job)
+
+
+def _worker_main(db_path, upload_dir, metrics_port=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(message)s')
+    if metrics_port:
+        metrics.start_http_server(metrics_port)
+    worker = JobWorker(JobQueue(db_path, upload_dir), api_key=get_secret("OPENAI_API_KEY"),
+                       hf_token=get_secret("HF_TOKEN"))
+    worker.run_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Job queue cho AI Meeting Assistant")
+    parser.add_argument("--db", default="./storage/jobs/queue.db", help="File SQLite lưu trạng thái job")
+    parser.add_argument("--uploads", default="./storage/uploads", help="Thư mục lưu file upload")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker_cmd = sub.add_parser("worker", help="Chạy worker xử lý job")
+    worker_cmd.add_argument("-p", "--processes", type=int, default=1, help="Số process worker")
+    worker_cmd.add_argument("--metrics-port", type=int, default=None,
+                            help="Xuất /metrics (Prometheus); process thứ i dùng cổng metrics-port + i")
+    status_cmd = sub.add_parser("status", help="Xem trạng thái job")
+    status_cmd.add_argument("job_id", nargs="?", help="ID job (bỏ trống để liệt kê các job gần đây)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    if args.command == "status":
+        job_queue = JobQueue(args.db, args.uploads)
+        jobs = [job_queue.status(args.job_id)] if args.job_id else job_queue.list_jobs()
+        for job in jobs:
+            if job is None:
+                print("Không tìm thấy job")
+                return 1
+            print(f"{job['id']}  {job['kind']:<11} {job['status']:<8} {job['progress']:>5.0%}  {job['message'] or job['error'] or ''}")
+        return 0
+
+    if not get_secret("OPENAI_API_KEY"):
+        logger.error("Chưa cấu hình OPENAI_API_KEY (biến môi trường hoặc .streamlit/secrets.toml)")
+        return 1
+
+    if args.processes <= 1:
+        _worker_main(args.db, args.uploads, args.metrics_port)
+        return 0
+
+    procs = [multiprocessing.Process(target=_worker_main, name=f"job-worker-{i}",
+                                     args=(args.db, args.uploads, args.metrics_port + i if args.metrics_port else None))
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Lớp đo đạc nhẹ (không phụ thuộc thư viện ngoài): counter, gauge, histogram và timing span,
+xuất ra định dạng text của Prometheus.
+
+Mỗi phiên (session) có thể dùng registry riêng với parent là REGISTRY toàn process:
+counter/histogram của phiên được cộng dồn lên REGISTRY, nên /metrics luôn có tổng;
+gauge (giá trị tức thời) được xuất lên REGISTRY kèm nhãn session để không ghi đè nhau.
+Code instrument gọi các hàm inc/observe/span ở mức module; chúng ghi vào registry
+đang được bind cho thread hiện tại (bind_registry), mặc định là REGISTRY.
+"""
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "meeting_"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 1e7)
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 15, 20, 30, 60)
+
+# Mô tả các metric đang được ghi (HELP trong output Prometheus)
+METRIC_HELP = {
+    "audio_recv_seconds": "Thời gian xử lý một frame WebRTC trong recv()",
+    "vad_frames_total": "Số window VAD đã chạy, theo kết quả speech",
+    "vad_inference_seconds": "Độ trễ một lần suy luận VAD",
+    "segments_total": "Số đoạn audio được cắt, theo nguồn (realtime/file)",
+    "segments_dropped_total": "Số đoạn audio bị bỏ do hàng đợi xử lý đầy",
+    "segment_duration_seconds": "Độ dài đoạn audio được cắt",
+    "diarization_seconds": "Độ trễ diarization một đoạn",
+    "diarization_errors_total": "Số lần diarization lỗi",
+    "asr_requests_total": "Số request ASR, theo backend",
+    "asr_latency_seconds": "Độ trễ một request ASR",
+    "asr_request_bytes": "Kích thước payload audio gửi lên ASR",
+    "asr_skipped_total": "Số đoạn quá ngắn, không gửi ASR",
+    "asr_errors_total": "Số request ASR lỗi",
+    "asr_hallucinations_filtered_total": "Số kết quả ASR bị lọc do ảo giác",
+    "punctuation_seconds": "Độ trễ thêm dấu câu một buffer",
+    "punctuation_words_total": "Số từ đã thêm dấu câu",
+    "pdf_ingest_seconds": "Thời gian vector hóa một file PDF (gồm embedding)",
+    "pdf_chunks_total": "Số đoạn PDF đã lưu vào Vector DB",
+    "retrieval_seconds": "Độ trễ truy vấn Vector DB (gồm embedding câu hỏi)",
+    "llm_requests_total": "Số request LLM",
+    "llm_latency_seconds": "Độ trễ một request LLM",
+    "llm_tokens_total": "Số token LLM, theo loại prompt/completion",
+    "pipeline_queue_depth": "Số phần tử đang chờ trong queue của RealtimePipeline",
+    "jobs_total": "Số job đã xử lý, theo loại và trạng thái",
+    "job_seconds": "Thời gian xử lý một job",
+}
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, parent=None):
+        self._lock = threading.Lock()
+        self._parent = parent
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+        if self._parent is not None:
+            self._parent.inc(amount)
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, parent=None):
+        # parent là gauge cùng tên trên registry cha, có thêm nhãn session
+        self._parent = parent
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+        if self._parent is not None:
+            self._parent.set(value)
+
+
+class Histogram:
+    """
+    Histogram theo bucket (cho Prometheus) kèm cửa sổ các mẫu gần nhất
+    để tính percentile chính xác cho bảng profiling.
+    """
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS, parent=None, window=1000):
+        self._lock = threading.Lock()
+        self._parent = parent
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+        if self._parent is not None:
+            self._parent.observe(value)
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class MetricsRegistry:
+    def __init__(self, parent=None, session_id=None):
+        """
+        parent: Registry cha nhận số liệu cộng dồn (vd: REGISTRY)
+        session_id: Nhãn "session" gắn cho gauge khi xuất lên parent
+        """
+        self.parent = parent
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    parent = None
+                    if self.parent is not None:
+                        parent_labels = labels
+                        if cls is Gauge and self.session_id is not None:
+                            parent_labels = dict(labels, session=self.session_id)
+                        parent = self.parent._get(cls, name, parent_labels, **kwargs)
+                    metric = cls(parent=parent, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, **labels):
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name, **labels):
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, labels, buckets=buckets)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def release_gauges(self, name):
+        """
+        Bỏ các gauge `name` của phiên này khỏi registry (và khỏi parent),
+        vd: khi pipeline dừng, để /metrics không giữ mãi series của phiên đã kết thúc.
+        """
+        with self._lock:
+            keys = [key for key, metric in self._metrics.items() if key[0] == name and metric.kind == "gauge"]
+            for key in keys:
+                del self._metrics[key]
+        if self.parent is not None and self.session_id is not None:
+            for _, labels in keys:
+                self.parent._remove((name, tuple(sorted(dict(labels, session=self.session_id).items()))))
+
+    def _remove(self, key):
+        with self._lock:
+            self._metrics.pop(key, None)
+
+    def _snapshot(self):
+        # Metric mới có thể được tạo từ thread khác trong lúc render
+        with self._lock:
+            return sorted(self._metrics.items())
+
+    def summary(self):
+        """
+        Bảng tóm tắt cho giao diện: mỗi metric một dòng.
+        """
+        rows = []
+        for (name, labels), metric in self._snapshot():
+            row = {"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels)}
+            if metric.kind == "histogram":
+                p50, p95 = metric.percentile(0.50), metric.percentile(0.95)
+                is_time = name.endswith("_seconds")
+                scale = 1000 if is_time else 1
+                row.update({
+                    "count": metric.count,
+                    "mean": round(metric.sum / metric.count * scale, 2) if metric.count else None,
+                    "p50": round(p50 * scale, 2) if p50 is not None else None,
+                    "p95": round(p95 * scale, 2) if p95 is not None else None,
+                    "unit": "ms" if is_time else ""
+                })
+            else:
+                row.update({"count": metric.value, "mean": None, "p50": None, "p95": None, "unit": ""})
+            rows.append(row)
+        return rows
+
+    def render_prometheus(self):
+        families = {}
+        for (name, labels), metric in self._snapshot():
+            families.setdefault(name, []).append((labels, metric))
+
+        lines = []
+        for name, series in families.items():
+            full_name = PREFIX + name
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {full_name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {full_name} {series[0][1].kind}")
+            for labels, metric in series:
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, metric.bucket_counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_label_text(labels, [('le', '+Inf')])} {metric.count}")
+                    lines.append(f"{full_name}_sum{_label_text(labels)} {metric.sum}")
+                    lines.append(f"{full_name}_count{_label_text(labels)} {metric.count}")
+                else:
+                    lines.append(f"{full_name}{_label_text(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry toàn process (tổng của mọi phiên)
+REGISTRY = MetricsRegistry()
+
+_local = threading.local()
+
+
+def bind_registry(registry):
+    """
+    Gắn registry cho thread hiện tại; các lời gọi inc/observe/span sau đó ghi vào registry này.
+    """
+    _local.registry = registry
+
+
+def current_registry():
+    return getattr(_local, "registry", None) or REGISTRY
+
+
+def inc(name, amount=1, **labels):
+    current_registry().counter(name, **labels).inc(amount)
+
+
+def set_gauge(name, value, **labels):
+    current_registry().gauge(name, **labels).set(value)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    current_registry().histogram(name, buckets=buckets, **labels).observe(value)
+
+
+@contextmanager
+def span(name, **labels):
+    """
+    Đo thời gian một khối lệnh (giây) vào histogram `name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def start_http_server(port, registry=REGISTRY, host="0.0.0.0"):
+    """
+    Phục vụ GET /metrics (định dạng Prometheus) trong thread nền.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Metrics server: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,59 @@
+"""
+Tiện ích ONNX Runtime cho các model chạy trên CPU (VAD, Punctuation).
+
+Lượng tử hóa int8 một model đã export:
+    python -m core.onnx_backend quantize model.onnx model_int8.onnx
+"""
+import sys
+import argparse
+import logging
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(model_path, num_threads=1):
+    """
+    Tạo InferenceSession trên CPU với số thread intra-op cố định.
+    Các model nhỏ (VAD, punctuation) chạy nhanh nhất với 1-2 thread và
+    không tranh CPU với các session khác.
+    """
+    if ort is None:
+        raise ImportError("Thư viện 'onnxruntime' chưa được cài đặt. Hãy chạy: pip install onnxruntime")
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    logger.info(f"Loading ONNX model {model_path} (intra_op_threads={num_threads})")
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def quantize_int8(src_path, dst_path):
+    """Lượng tử hóa động trọng số về int8 (không cần dữ liệu calibration)."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(src_path, dst_path, weight_type=QuantType.QInt8)
+    logger.info(f"Saved int8 model to {dst_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Công cụ ONNX Runtime")
+    sub = parser.add_subparsers(dest="command", required=True)
+    quant = sub.add_parser("quantize", help="Lượng tử hóa int8 một model ONNX")
+    quant.add_argument("src")
+    quant.add_argument("dst")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    if args.command == "quantize":
+        quantize_int8(args.src, args.dst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,12 +2,64 @@ import pdfplumber
 import chromadb
 from chromadb.utils import embedding_functions
 import os
+import re
+import logging
 from openai import OpenAI
 
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Token ở đây là các cụm ký tự không chứa khoảng trắng (xấp xỉ số từ)
+_TOKEN_PATTERN = re.compile(r"\S+")
+
+
+def chunk_text(text, chunk_size=200, chunk_overlap=40):
+    """
+    Chia text thành các đoạn (passage) theo số token, có phần chồng lấn.
+
+    Returns:
+        List các tuple (chunk_text, char_start, char_end) với offset tính
+        theo ký tự trong text gốc.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size phải lớn hơn 0")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap phải nằm trong khoảng [0, chunk_size)")
+
+    spans = [m.span() for m in _TOKEN_PATTERN.finditer(text)]
+    if not spans:
+        return []
+
+    chunks = []
+    step = chunk_size - chunk_overlap
+    for start_tok in range(0, len(spans), step):
+        window = spans[start_tok:start_tok + chunk_size]
+        char_start, char_end = window[0][0], window[-1][1]
+        chunks.append((text[char_start:char_end], char_start, char_end))
+        # Cửa sổ cuối đã chạm hết text thì dừng, tránh sinh đoạn chỉ toàn overlap
+        if start_tok + chunk_size >= len(spans):
+            break
+    return chunks
+
+
+def stale_chunk_ids(existing_ids, new_ids):
+    """
+    Các ID đang có trong Vector DB nhưng không còn trong lần nạp mới (giữ nguyên thứ tự).
+    """
+    keep = set(new_ids)
+    return [i for i in existing_ids if i not in keep]
+
+
 class PDFKnowledgeBase:
-    def __init__(self, api_key, collection_name, persist_directory="./storage/vector_store"):
+    def __init__(self, api_key, collection_name, persist_directory="./storage/vector_store",
+                 chunk_size=200, chunk_overlap=40, base_url=None):
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+
+        # Cấu hình chia đoạn (tính theo token)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         
         # 1. Khởi tạo ChromaDB Client
         self.chroma_client = chromadb.PersistentClient(path=persist_directory)
@@ -16,6 +68,7 @@ class PDFKnowledgeBase:
         # Nó sẽ tự động gọi API 'text-embedding-3-small' khi thêm/tìm dữ liệu
         self.embedding_fn = embedding_functions.OpenAIEmbeddingFunction(
             api_key=api_key,
+            api_base=base_url,
             model_name="text-embedding-3-small"
         )
         
@@ -27,12 +80,15 @@ class PDFKnowledgeBase:
 
     def process_and_store_pdf(self, pdf_path):
         """
-        Đọc từng trang PDF và lưu vào Vector DB.
+        Đọc từng trang PDF, chia thành các đoạn nhỏ theo token và lưu vào Vector DB.
+        ID của mỗi đoạn chỉ phụ thuộc vào tên file, số trang và vị trí đoạn,
+        nên nạp lại cùng một file sẽ ghi đè chứ không nhân bản dữ liệu.
         """
-        print(f"Đang xử lý PDF: {pdf_path}")
+        logger.info(f"Đang xử lý PDF: {pdf_path}")
+        source = os.path.basename(pdf_path)
         
         # Dùng pdfplumber để trích xuất text tốt hơn
-        with pdfplumber.open(pdf_path) as pdf:
+        with metrics.span("pdf_ingest_seconds"), pdfplumber.open(pdf_path) as pdf:
             documents = []
             metadatas = []
             ids = []
@@ -54,39 +110,53 @@ class PDFKnowledgeBase:
                 if len(text) > 10: # Chỉ lưu trang có nội dung đáng kể
                     page_num = i + 1
                     
-                    # Chuẩn bị dữ liệu cho Chroma
-                    documents.append(text)
-                    
-                    # Metadata cực kỳ quan trọng để map ngược lại
-                    metadatas.append({
-                        "source": os.path.basename(pdf_path),
-                        "page_number": page_num
-                    })
-                    
-                    # ID duy nhất
-                    ids.append(f"{os.path.basename(pdf_path)}_page_{page_num}")
+                    # 3. Chia trang thành các đoạn nhỏ (có chồng lấn)
+                    chunks = chunk_text(text, self.chunk_size, self.chunk_overlap)
+                    for chunk_idx, (chunk, char_start, char_end) in enumerate(chunks):
+                        documents.append(chunk)
+                        
+                        # Metadata cực kỳ quan trọng để map ngược lại
+                        metadatas.append({
+                            "source": source,
+                            "page_number": page_num,
+                            "chunk_index": chunk_idx,
+                            "char_start": char_start,
+                            "char_end": char_end
+                        })
+                        
+                        # ID ổn định (idempotent khi nạp lại)
+                        ids.append(f"{source}_page_{page_num}_chunk_{chunk_idx}")
             
-            # 3. Lưu Batch vào ChromaDB
+            # 4. Lưu Batch vào ChromaDB trước, sau đó mới xóa các đoạn cũ của file này không còn
+            # trong bản mới (cấu hình chunk có thể đã đổi). Lỗi giữa chừng không làm mất tài liệu
+            # và truy vấn RAG đồng thời luôn thấy bản cũ hoặc bản mới.
             if documents:
-                print(f"Đang lưu {len(documents)} trang vào Vector DB...")
+                logger.info(f"Đang lưu {len(documents)} đoạn vào Vector DB...")
                 self.collection.upsert(
                     documents=documents,
                     metadatas=metadatas,
                     ids=ids
                 )
-                print("Đã lưu xong PDF.")
+                metrics.inc("pdf_chunks_total", len(documents))
+                logger.info("Đã lưu xong PDF.")
             else:
-                print("PDF không có text trích xuất được.")
+                logger.warning("PDF không có text trích xuất được.")
+
+            stale_ids = stale_chunk_ids(self.collection.get(where={"source": source}, include=[])["ids"], ids)
+            if stale_ids:
+                logger.info(f"Xóa {len(stale_ids)} đoạn cũ của {source}")
+                self.collection.delete(ids=stale_ids)
 
     def find_relevant_pages(self, transcript_chunk, n_results=2):
         """
         Input: Một đoạn transcript (lời nói)
-        Output: Nội dung các trang PDF liên quan nhất
+        Output: Nội dung các đoạn PDF liên quan nhất (kèm số trang và vị trí)
         """
-        results = self.collection.query(
-            query_texts=[transcript_chunk],
-            n_results=n_results
-        )
+        with metrics.span("retrieval_seconds"):
+            results = self.collection.query(
+                query_texts=[transcript_chunk],
+                n_results=n_results
+            )
         
         # Format kết quả trả về cho dễ dùng
         relevant_context = []
@@ -96,7 +166,10 @@ class PDFKnowledgeBase:
                 relevant_context.append({
                     "text": doc,
                     "page": meta['page_number'],
-                    "source": meta['source']
+                    "source": meta['source'],
+                    "chunk_index": meta.get('chunk_index', 0),
+                    "char_start": meta.get('char_start'),
+                    "char_end": meta.get('char_end')
                 })
         
         return relevant_context
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+import queue
+import logging
+import tempfile
+import threading
+import soundfile as sf
+
+from core import metrics
+from core.punctuation import get_punctuation_restorer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEAKER = "Người nói"
+
+
+def dominant_speaker(speaker_segments, start=None, end=None):
+    """
+    Người nói chiếm thời lượng lớn nhất trong [start, end] (giây, None = không giới hạn).
+    """
+    durations = {}
+    for s in speaker_segments:
+        seg_start = s['start'] if start is None else max(s['start'], start)
+        seg_end = s['end'] if end is None else min(s['end'], end)
+        if seg_end > seg_start:
+            durations[s['speaker']] = durations.get(s['speaker'], 0) + (seg_end - seg_start)
+    return max(durations, key=durations.get) if durations else DEFAULT_SPEAKER
+
+
+def detect_speaker(diarizer, audio_chunk, sample_rate=16000):
+    """
+    Chạy diarization trên một đoạn audio và trả về người nói chiếm thời lượng lớn nhất.
+    Mỗi lần gọi dùng file tạm riêng; bản thân lần chạy pipeline được OfflineDiarizer
+    tuần tự hóa bằng lock, nên có thể gọi từ nhiều thread.
+    """
+    if diarizer is None:
+        return DEFAULT_SPEAKER
+
+    speaker = DEFAULT_SPEAKER
+    fd, temp_wav = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        sf.write(temp_wav, audio_chunk, sample_rate)
+        with metrics.span("diarization_seconds"):
+            diar = diarizer.process_file(temp_wav)
+        speaker = dominant_speaker(diar.get("speaker_segments", []))
+    except Exception as e:
+        metrics.inc("diarization_errors_total")
+        logger.warning(f"Diarization error: {e}")
+    finally:
+        if os.path.exists(temp_wav):
+            os.remove(temp_wav)
+    return speaker
+
+
+class RealtimePipeline:
+    """
+    Pipeline xử lý nền cho tab Real-time:
+
+        VAD queue -> [diarization + ASR] x N worker -> punctuation -> results
+        interim queue -> ASR nháp ------------------------------------^
+
+    Các hàng đợi giữa các stage có giới hạn (bounded). Khi worker chậm, stage
+    phía trước bị chặn lại (backpressure) thay vì dồn việc vô hạn; audio chưa xử lý
+    nằm lại trong output_queue (cũng có giới hạn) của RealTimeAudioProcessor; khi queue
+    đó đầy, recv() bỏ câu cũ nhất chứ không bao giờ bị block.
+    UI chỉ cần đọc `results` để render. Số liệu đo của mọi stage được ghi vào `registry`
+    (MetricsRegistry của phiên). Mỗi kết quả là một dict:
+
+        {"type": "final", "segment_id", "speaker", "text", "pending_text"}
+            Câu đã cắt xong. "text" rỗng nếu câu còn nằm trong buffer dấu câu,
+            "pending_text" là phần text thô đang chờ thêm dấu câu.
+        {"type": "interim", "segment_id", "text"}
+            Bản nháp của câu đang nói, sẽ bị thay bằng kết quả "final" cùng segment_id.
+    """
+
+    def __init__(self, source_queue, asr_model, diarizer=None, punctuate=None,
+                 num_workers=2, max_queue_size=8, interim_queue=None, pending_text=None,
+                 registry=None):
+        """
+        punctuate(raw_text, force_flush) / pending_text(): buffer dấu câu riêng của phiên
+        (vd: restorer.restore / restorer.pending_text với restorer = get_punctuation_restorer().new_buffer()).
+        Mặc định pipeline tự tạo một buffer riêng, không dùng chung buffer của singleton.
+        """
+        if punctuate is None:
+            restorer = get_punctuation_restorer().new_buffer()
+            punctuate, pending_text = restorer.restore, restorer.pending_text
+        self.source_queue = source_queue
+        self.registry = registry or metrics.REGISTRY
+        self.interim_queue = interim_queue
+        self.pending_text = pending_text or (lambda: "")
+        self.asr_model = asr_model
+        self.diarizer = diarizer
+        self.punctuate = punctuate
+        self.num_workers = num_workers
+
+        self.segment_queue = queue.Queue(maxsize=max_queue_size)
+        self.text_queue = queue.Queue(maxsize=max_queue_size)
+        self.results = queue.Queue(maxsize=max_queue_size * 4)
+
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._last_final_segment = -1
+
+    # --- Vòng đời ---
+    def start(self):
+        targets = [("vad-feeder", self._feed_loop), ("punctuation", self._punctuation_loop)]
+        targets += [(f"asr-worker-{i}", self._asr_loop) for i in range(self.num_workers)]
+        if self.interim_queue is not None:
+            targets.append(("interim-asr", self._interim_loop))
+        for name, target in targets:
+            t = threading.Thread(target=self._run_bound, args=(target,), name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Realtime pipeline started with {self.num_workers} ASR workers")
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+        self.registry.release_gauges("pipeline_queue_depth")
+        logger.info("Realtime pipeline stopped")
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    @property
+    def in_flight(self):
+        """Số đoạn audio đã nhận nhưng chưa xử lý xong."""
+        with self._lock:
+            return self._submitted - self._completed
+
+    def get_result(self, timeout=0.1):
+        """Lấy một kết quả đã thêm dấu câu, trả về None nếu chưa có."""
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # --- Helpers ---
+    def _run_bound(self, target):
+        metrics.bind_registry(self.registry)
+        target()
+
+    def _record_queue_depths(self):
+        metrics.set_gauge("pipeline_queue_depth", self.source_queue.qsize(), queue="source")
+        metrics.set_gauge("pipeline_queue_depth", self.segment_queue.qsize(), queue="segment")
+        metrics.set_gauge("pipeline_queue_depth", self.text_queue.qsize(), queue="text")
+        metrics.set_gauge("pipeline_queue_depth", self.results.qsize(), queue="results")
+
+    def _put(self, q, item):
+        # put có timeout để còn kiểm tra tín hiệu dừng khi hàng đợi đầy (backpressure)
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            return None
+
+    # --- Stages ---
+    def _feed_loop(self):
+        seq = 0
+        while not self._stop_event.is_set():
+            item = self._get(self.source_queue)
+            if item is None:
+                continue
+            segment_id, audio = item
+            with self._lock:
+                self._submitted += 1
+            if not self._put(self.segment_queue, (seq, segment_id, audio)):
+                return
+            seq += 1
+            self._record_queue_depths()
+
+    def _asr_loop(self):
+        while not self._stop_event.is_set():
+            item = self._get(self.segment_queue)
+            if item is None:
+                continue
+            seq, segment_id, audio = item
+            self._record_queue_depths()
+
+            speaker = DEFAULT_SPEAKER
+            raw_text = ""
+            try:
+                speaker = detect_speaker(self.diarizer, audio)
+                if self.asr_model:
+                    res = self.asr_model.predict(audio)
+                    raw_text = res.get('text', '').strip()
+            except Exception as e:
+                logger.error(f"ASR worker error: {e}")
+
+            if not self._put(self.text_queue, (seq, segment_id, speaker, raw_text)):
+                return
+
+    def _interim_loop(self):
+        while not self._stop_event.is_set():
+            item = self._get(self.interim_queue)
+            if item is None:
+                continue
+            segment_id, audio = item
+            # Câu đã có kết quả cuối thì bản nháp không còn ý nghĩa
+            if segment_id <= self._last_final_segment:
+                continue
+
+            try:
+                res = self.asr_model.predict(audio, previous_text=self.pending_text()) if self.asr_model else {}
+                text = res.get('text', '').strip()
+            except Exception as e:
+                logger.error(f"Interim ASR error: {e}")
+                continue
+
+            if text and segment_id > self._last_final_segment:
+                self._put(self.results, {"type": "interim", "segment_id": segment_id, "text": text})
+
+    def _punctuation_loop(self):
+        # Các worker có thể trả kết quả lệch thứ tự -> sắp xếp lại theo seq
+        pending = {}
+        next_seq = 0
+        while not self._stop_event.is_set():
+            item = self._get(self.text_queue)
+            if item is None:
+                continue
+            seq, segment_id, speaker, raw_text = item
+            pending[seq] = (segment_id, speaker, raw_text)
+
+            while next_seq in pending:
+                segment_id, speaker, raw_text = pending.pop(next_seq)
+                next_seq += 1
+                with self._lock:
+                    self._completed += 1
+                self._last_final_segment = segment_id
+
+                punct = self.punctuate(raw_text, force_flush=False) if raw_text else None
+                result = {
+                    "type": "final",
+                    "segment_id": segment_id,
+                    "speaker": speaker,
+                    "text": punct['punctuated_text'] if punct else "",
+                    "pending_text": self.pending_text()
+                }
+                if not self._put(self.results, result):
+                    return
+                self._record_queue_depths()
@@ -1,5 +1,9 @@
+import os
+import copy
 import logging
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
+
+from core import metrics
 try:
     from fastpunct import FastPunct
 except ImportError:
@@ -8,21 +12,107 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Punctuation")
 
+# Map nhãn token-classification -> dấu câu gắn sau từ
+_LABEL_PUNCT = [("QUESTION", "?"), ("EXCLAM", "!"), ("PERIOD", "."), ("COMMA", ","), ("COLON", ":"),
+                ("?", "?"), ("!", "!"), (".", "."), (",", ","), (":", ":")]
+
+class OnnxPunctuationModel:
+    """
+    Model thêm dấu câu dạng token classification (export ONNX, có thể là bản int8)
+    chạy bằng ONNX Runtime. Có cùng interface punct(List[str]) với FastPunct.
+
+    Lưu ý: đây là một model KHÁC với FastPunct (seq2seq sinh lại cả câu), không phải
+    FastPunct được export sang ONNX. Chỉ gán dấu sau từng từ, không sửa chữ hoa/chính tả,
+    nên kết quả khác backend 'fastpunct' và số đo độ trễ giữa hai backend là so sánh
+    hai model khác nhau.
+
+    Thư mục model gồm: file .onnx, tokenizer (tokenizer.json/vocab...) và
+    config.json chứa id2label (vd: O, COMMA, PERIOD, QUESTION).
+    """
+
+    def __init__(self, model_dir: str, onnx_file: str = None, num_threads: int = 1, max_length: int = 256):
+        import json
+        from transformers import AutoTokenizer
+        from core.onnx_backend import create_session
+
+        # Ưu tiên bản int8 nếu có
+        if onnx_file is None:
+            onnx_file = "model_int8.onnx" if os.path.exists(os.path.join(model_dir, "model_int8.onnx")) else "model.onnx"
+        self.session = create_session(os.path.join(model_dir, onnx_file), num_threads)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            id2label = json.load(f)["id2label"]
+        self.id2punct = {int(i): self._label_to_punct(label) for i, label in id2label.items()}
+        self.max_length = max_length
+
+    @staticmethod
+    def _label_to_punct(label: str) -> str:
+        upper = label.upper()
+        for key, punct in _LABEL_PUNCT:
+            if key in upper:
+                return punct
+        return ""
+
+    def _punct_one(self, text: str) -> str:
+        words = text.split()
+        if not words:
+            return text
+        enc = self.tokenizer(words, is_split_into_words=True, truncation=True,
+                             max_length=self.max_length, return_tensors="np")
+        feeds = {name: enc[name].astype("int64") for name in self.input_names if name in enc}
+        logits = self.session.run(None, feeds)[0][0]
+        preds = logits.argmax(axis=-1)
+
+        # Nhãn của từ = nhãn của sub-token cuối cùng thuộc từ đó
+        word_punct = [""] * len(words)
+        for token_idx, word_idx in enumerate(enc.word_ids()):
+            if word_idx is not None:
+                word_punct[word_idx] = self.id2punct.get(int(preds[token_idx]), "")
+
+        out = []
+        capitalize = True
+        for word, punct in zip(words, word_punct):
+            word = word.rstrip(".,?!:")
+            if capitalize:
+                word = word[:1].upper() + word[1:]
+            out.append(word + punct)
+            capitalize = punct in (".", "?", "!")
+        result = " ".join(out)
+        if result and result[-1] not in ".?!":
+            result += "."
+        return result
+
+    def punct(self, texts: List[str]) -> List[str]:
+        return [self._punct_one(t) for t in texts]
+
 class PunctuationRestorer:
     """
     Module khôi phục dấu câu và viết hoa cho văn bản thô từ ASR.
-    Sử dụng thư viện fastpunct.
+    Sử dụng thư viện fastpunct, hoặc model ONNX cục bộ (backend='onnx').
     """
     
-    def __init__(self, model_name: str = None, device: str = 'cpu'):
+    def __init__(self, model_name: str = None, device: str = 'cpu', backend: str = 'fastpunct',
+                 onnx_model_dir: str = None, num_threads: int = 1):
         """
         Khởi tạo PunctuationRestorer.
         
         Args:
             model_name: Tên model fastpunct (nếu None sẽ dùng mặc định)
             device: 'cuda' hoặc 'cpu'
+            backend: 'fastpunct' hoặc 'onnx'
+            onnx_model_dir: Thư mục model ONNX khi backend='onnx'
+            num_threads: Số thread intra-op cho ONNX Runtime
         """
-        if FastPunct is None:
+        if backend == 'onnx':
+            logger.info("⏳ Đang tải model Punctuation (ONNX)...")
+            try:
+                self.model = OnnxPunctuationModel(onnx_model_dir, num_threads=num_threads)
+                logger.info("Punctuation Model (ONNX) Loaded!")
+            except Exception as e:
+                logger.error(f"Lỗi tải model Punctuation ONNX: {e}")
+                self.model = None
+        elif FastPunct is None:
             logger.error("Thư viện 'fastpunct' chưa được cài đặt. Hãy chạy: pip install fastpunct")
             self.model = None
         else:
@@ -35,10 +125,37 @@ class PunctuationRestorer:
                 logger.error(f"Lỗi tải FastPunct: {e}")
                 self.model = None
 
+        self.backend = backend
+
         # 1. Internal text buffer
         self.buffer: str = ""
         self.word_threshold: int = 20  # Ngưỡng số từ để kích hoạt xử lý
 
+    def new_buffer(self) -> "PunctuationRestorer":
+        """
+        Tạo restorer dùng chung model (không tải lại) nhưng có buffer riêng,
+        để mỗi job/phiên không ghi đè text đang chờ của nhau.
+        """
+        restorer = copy.copy(self)
+        restorer.buffer = ""
+        return restorer
+
+    def restore(self, raw_text: str, force_flush: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Thêm text mới vào buffer; nếu chưa đủ điều kiện nhưng force_flush=True
+        (khoảng lặng dài / kết thúc phiên) thì xử lý luôn phần còn lại.
+        """
+        result = self.add_text(raw_text) if raw_text else None
+        if result is None and force_flush:
+            result = self.flush()
+        return result
+
+    def pending_text(self) -> str:
+        """
+        Phần text thô đang nằm trong buffer (chưa đủ điều kiện thêm dấu câu).
+        """
+        return self.buffer
+
     def add_text(self, raw_text: str) -> Optional[Dict[str, Any]]:
         """
         Thêm text thô vào buffer và kiểm tra điều kiện xử lý.
@@ -99,11 +216,13 @@ class PunctuationRestorer:
             input_text = self.buffer
             
             # Model trả về list kết quả
-            output = self.model.punct([input_text])
+            with metrics.span("punctuation_seconds", backend=self.backend):
+                output = self.model.punct([input_text])
             punctuated_text = output[0] if output else input_text
 
             # Đếm số từ
             word_count = len(punctuated_text.split())
+            metrics.inc("punctuation_words_total", word_count)
 
             # Tạo kết quả
             result = {
@@ -132,6 +251,16 @@ class PunctuationRestorer:
 # --- INSTANCE GLOBAL (SINGLETON) ---
 _punct_instance = None
 
+def get_punctuation_restorer(**kwargs) -> PunctuationRestorer:
+    """
+    Trả về instance dùng chung (khởi tạo model ở lần gọi đầu tiên).
+    kwargs (backend, onnx_model_dir, num_threads...) chỉ có tác dụng ở lần khởi tạo.
+    """
+    global _punct_instance
+    if _punct_instance is None:
+        _punct_instance = PunctuationRestorer(**kwargs)
+    return _punct_instance
+
 def restore_punctuation(raw_text: str, force_flush: bool = False) -> Optional[Dict[str, Any]]:
     """
     Hàm wrapper để gọi từ App chính dễ dàng hơn.
@@ -140,17 +269,12 @@ def restore_punctuation(raw_text: str, force_flush: bool = False) -> Optional[Di
         raw_text: Text mới nhận từ ASR
         force_flush: True nếu phát hiện khoảng lặng dài (Long Silence)
     """
-    global _punct_instance
-    if _punct_instance is None:
-        _punct_instance = PunctuationRestorer()
+    return get_punctuation_restorer().restore(raw_text, force_flush=force_flush)
 
-    # Nếu có text mới, thêm vào
-    result = None
-    if raw_text:
-        result = _punct_instance.add_text(raw_text)
-    
-    # Nếu chưa có kết quả (chưa đủ buffer) NHƯNG bị ép flush (do im lặng)
-    if result is None and force_flush:
-        result = _punct_instance.flush()
-        
-    return result
\ No newline at end of file
+def get_pending_text() -> str:
+    """
+    Trả về phần text thô đang nằm trong buffer (chưa đủ điều kiện thêm dấu câu).
+    """
+    if _punct_instance is None:
+        return ""
+    return _punct_instance.pending_text()
\ No newline at end of file
@@ -1,8 +1,14 @@
+import logging
 from openai import OpenAI
 
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
 class MeetingMinuteGenerator:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key, base_url=None):
+        # base_url: endpoint tương thích OpenAI (vd: mock server khi benchmark)
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
 
     def generate_minute_with_rag(self, transcript_segment, pdf_context_list):
         """
@@ -43,16 +49,72 @@ class MeetingMinuteGenerator:
         """
 
         # 3. Gọi GPT-4o-mini (Rẻ và nhanh) hoặc GPT-4o (Thông minh hơn)
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.3
-        )
+        model = "gpt-4o-mini"
+        metrics.inc("llm_requests_total", model=model)
+        with metrics.span("llm_latency_seconds", model=model):
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=0.3
+            )
+        if getattr(response, "usage", None):
+            metrics.inc("llm_tokens_total", response.usage.prompt_tokens or 0, model=model, kind="prompt")
+            metrics.inc("llm_tokens_total", response.usage.completion_tokens or 0, model=model, kind="completion")
         
         return {
             "summary": response.choices[0].message.content,
             "ref_pages": list(set(used_pages)) # Trả về danh sách trang đã tham khảo
-        }
\ No newline at end of file
+        }
+
+    def generate_minutes(self, transcript_entries, pdf_kb=None, chunk_size=10, progress_callback=None):
+        """
+        Tạo biên bản cho toàn bộ transcript: gom chunk_size câu thành một đoạn,
+        tìm ngữ cảnh trong PDF (nếu có pdf_kb) rồi gọi LLM cho từng đoạn.
+
+        transcript_entries: List {"speaker", "text"}
+        progress_callback: Hàm (done, total) được gọi sau mỗi đoạn
+        """
+        logger.info(f"🤖 [RAG START] Tạo biên bản: {len(transcript_entries)} câu, "
+                    f"PDF: {'Đã có' if pdf_kb else 'Không có'}")
+
+        full_summary = ""
+        
+        # 1. Convert transcript to text lines
+        raw_lines = [f"{x['speaker']}: {x['text']}" for x in transcript_entries]
+        
+        # 2. Chunking Transcript (Gom 10 câu làm 1 chunk để query)
+        trans_chunks = ["\n".join(raw_lines[i:i+chunk_size]) for i in range(0, len(raw_lines), chunk_size)]
+        
+        for idx, t_chunk in enumerate(trans_chunks):
+            logger.info(f"🔄 [CHUNK {idx+1}/{len(trans_chunks)}] XỬ LÝ ĐOẠN HỘI THOẠI")
+            logger.debug(f"📝 Nội dung chunk (rút gọn): {t_chunk[:100].replace(chr(10), ' ')}...")
+            
+            # 3. Retrieval (Tìm kiếm PDF)
+            relevant_pages = []
+            if pdf_kb:
+                relevant_pages = pdf_kb.find_relevant_pages(t_chunk)
+                
+                if relevant_pages:
+                    logger.info(f"✅ [FOUND] Tìm thấy {len(relevant_pages)} ngữ cảnh liên quan")
+                    for p in relevant_pages:
+                        logger.debug(f"    - [Trang {p['page']}]: {p['text'][:80]}...")
+                else:
+                    logger.info("⚠️ [NOT FOUND] Không tìm thấy thông tin khớp trong PDF.")
+
+            # 4. Generation (Gọi LLM)
+            res = self.generate_minute_with_rag(t_chunk, relevant_pages)
+            
+            # 5. Ghép kết quả
+            full_summary += f"\n#### Phần {idx+1}\n{res['summary']}\n"
+            if res['ref_pages']:
+                full_summary += f"*(Nguồn tham khảo: Trang {res['ref_pages']})*\n"
+            
+            if progress_callback:
+                progress_callback(idx + 1, len(trans_chunks))
+        
+        logger.info("✅ [RAG FINISH] ĐÃ TẠO XONG BIÊN BẢN")
+        
+        return full_summary
@@ -0,0 +1,45 @@
+import html
+
+# Màu hiển thị cho từng người nói
+SPEAKER_COLORS = {"SPEAKER_00": "#00cc66", "SPEAKER_01": "#0099ff", "Người nói": "#999999"}
+
+
+class TranscriptStore:
+    """
+    Lưu transcript dạng có cấu trúc (list các câu) thay vì một chuỗi HTML lớn.
+    UI chỉ cần render câu mới thêm vào, hoặc một trang cố định khi rerun,
+    nên chi phí mỗi lần cập nhật không tăng theo độ dài cuộc họp.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, text, speaker):
+        entry = {"speaker": speaker, "text": text}
+        self.entries.append(entry)
+        return entry
+
+    def clear(self):
+        self.entries = []
+
+    def num_pages(self, page_size):
+        return max(1, -(-len(self.entries) // page_size))
+
+    def page(self, page_index, page_size):
+        """
+        Trả về các câu thuộc trang page_index (bắt đầu từ 0).
+        """
+        start = page_index * page_size
+        return self.entries[start:start + page_size]
+
+
+def entry_to_html(entry):
+    speaker = entry["speaker"]
+    color = SPEAKER_COLORS.get(speaker, "#333333")
+    return (
+        f"<div class='final-box' style='border-left-color: {color};'>"
+        f"<b style='color:{color}'>{html.escape(str(speaker))}:</b> {html.escape(entry['text'])}</div>"
+    )
@@ -1,20 +1,74 @@
 # core/vad.py
 import torch
 import logging
-import numpy as np 
+import numpy as np
+
+from core import metrics
 
 logger = logging.getLogger(__name__)
 
+class OnnxSileroVAD:
+    """
+    Silero VAD chạy bằng ONNX Runtime (hỗ trợ file export của cả v4 lẫn v5).
+    Giữ trạng thái RNN giữa các lần gọi giống như model torch.
+    """
+    def __init__(self, model_path, num_threads=1):
+        from core.onnx_backend import create_session
+        self.session = create_session(model_path, num_threads)
+        input_names = [i.name for i in self.session.get_inputs()]
+        # v5: input/state/sr, v4: input/sr/h/c
+        self.is_v5 = "state" in input_names
+        self.reset_states()
+
+    def reset_states(self):
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._h = np.zeros((2, 1, 64), dtype=np.float32)
+        self._c = np.zeros((2, 1, 64), dtype=np.float32)
+        self._context = None
+
+    def __call__(self, audio_float32_array, sample_rate=16000):
+        x = audio_float32_array.reshape(1, -1).astype(np.float32, copy=False)
+        sr = np.array(sample_rate, dtype=np.int64)
+
+        if self.is_v5:
+            # v5 cần ghép 64 mẫu cuối của window trước (32 với 8kHz)
+            context_size = 64 if sample_rate == 16000 else 32
+            if self._context is None:
+                self._context = np.zeros((1, context_size), dtype=np.float32)
+            x = np.concatenate([self._context, x], axis=1)
+            out, self._state = self.session.run(None, {"input": x, "state": self._state, "sr": sr})
+            self._context = x[:, -context_size:]
+        else:
+            out, self._h, self._c = self.session.run(None, {"input": x, "sr": sr, "h": self._h, "c": self._c})
+
+        return float(out.reshape(-1)[0])
+
 class VADDetector:
-    def __init__(self):
-        logger.info("Initializing VAD...")
+    def __init__(self, backend="torch", onnx_path=None, num_threads=1):
+        """
+        backend: 'torch' (tải Silero qua torch.hub) hoặc 'onnx' (file .onnx cục bộ, có thể là bản int8)
+        onnx_path: Đường dẫn model ONNX khi backend='onnx'
+        num_threads: Số thread intra-op cho ONNX Runtime
+        """
+        self.backend = backend
+        logger.info(f"Initializing VAD ({backend})...")
+
+        if backend == "onnx":
+            try:
+                self.model = OnnxSileroVAD(onnx_path, num_threads)
+                logger.info(f"Silero VAD (ONNX) loaded from {onnx_path}")
+            except Exception as e:
+                logger.error(f"Error loading Silero VAD ONNX: {e}")
+                self.model = None
+            return
+
         try:
             # Thêm trust_repo=True
             self.model, utils = torch.hub.load(
                 repo_or_dir='snakers4/silero-vad',
                 model='silero_vad',
                 force_reload=False,
-                trust_repo=True 
+                trust_repo=True
             )
             self.get_speech_ts, _, _, _, _ = utils
             logger.info("Silero VAD loaded successfully")
@@ -31,19 +85,21 @@ class VADDetector:
         if not audio_float32_array.flags['C_CONTIGUOUS']:
             audio_float32_array = np.ascontiguousarray(audio_float32_array)
 
+        if audio_float32_array.ndim > 1:
+            audio_float32_array = audio_float32_array.squeeze()
+        if len(audio_float32_array) < 512:
+            return 0.0
+
         try:
-            audio_tensor = torch.from_numpy(audio_float32_array)
-            
-            if len(audio_tensor) < 512:
-                return 0.0
-
-            # Xử lý dimension nếu cần (Silero chấp nhận mảng 1 chiều)
-            if audio_tensor.ndim > 1:
-                audio_tensor = audio_tensor.squeeze()
-
-            with torch.no_grad():
-                speech_prob = self.model(audio_tensor, sample_rate).item()
-            
+            with metrics.span("vad_inference_seconds", backend=self.backend):
+                if self.backend == "onnx":
+                    return self.model(audio_float32_array, sample_rate)
+
+                audio_tensor = torch.from_numpy(audio_float32_array)
+
+                with torch.no_grad():
+                    speech_prob = self.model(audio_tensor, sample_rate).item()
+
             return speech_prob
         except Exception as e:
             logger.error(f"VAD Error: {e}")
@@ -1,21 +1,28 @@
 import streamlit as st
 from streamlit_webrtc import webrtc_streamer, WebRtcMode
-import queue
-import time
 import logging
 import os
+import html
+import time
 import uuid
-import soundfile as sf
-import librosa
+import weakref
 
 # --- IMPORT MODULES ---
 from core.vad import VADDetector
 from core.audio_processor import RealTimeAudioProcessor
-from core.punctuation import restore_punctuation
-from core.openai_asr import OpenAIASRService 
+from core.punctuation import get_punctuation_restorer
+from core.asr import create_asr_service
 from core.diarization import OfflineDiarizer 
 from core.pdf_processor import PDFKnowledgeBase
 from core.rag_service import MeetingMinuteGenerator
+from core.transcript import TranscriptStore, entry_to_html
+from core.pipeline import RealtimePipeline
+from core.audio_stream import probe_duration
+from core.checkpoint import JobCheckpoint
+from core.file_processor import transcribe_file, ASRRequestError
+from core.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from core.config import inference_config
+from core import metrics
 
 # Cấu hình Log để in ra Terminal đẹp hơn
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -36,9 +43,26 @@ if "HF_TOKEN" in st.secrets:
 else:
     HF_TOKEN = None
 
-# Session ID
+# Giá trị mặc định của toggle "Xử lý nền" (tắt nếu không khai báo; cần chạy worker: python -m core.jobs worker)
+USE_JOB_QUEUE = bool(st.secrets.get("USE_JOB_QUEUE", False))
+
+# Session ID (giữ trên URL để tải lại trang vẫn tìm lại được các job nền của phiên)
 if "session_id" not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+    st.session_state.session_id = st.experimental_get_query_params().get("sid", [None])[0] or str(uuid.uuid4())
+    st.experimental_set_query_params(sid=st.session_state.session_id)
+
+# Số liệu đo của phiên (cộng dồn lên registry toàn process, xuất qua /metrics nếu có METRICS_PORT)
+if "metrics" not in st.session_state:
+    st.session_state.metrics = metrics.MetricsRegistry(parent=metrics.REGISTRY,
+                                                       session_id=st.session_state.session_id[:8])
+metrics.bind_registry(st.session_state.metrics)
+
+@st.cache_resource
+def start_metrics_server(port):
+    return metrics.start_http_server(port)
+
+if st.secrets.get("METRICS_PORT"):
+    start_metrics_server(int(st.secrets["METRICS_PORT"]))
 
 # CSS
 st.markdown("""
@@ -50,11 +74,18 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 1. LOAD SERVICES ---
+@st.cache_resource
+def _get_asr_service_cached():
+    # Một ASR service cho cả process: model Whisper local chỉ nạp một lần, dùng chung cho mọi phiên
+    logger.info("🚀 [SYSTEM] KHỞI TẠO ASR SERVICE")
+    return create_asr_service(api_key=API_KEY, **inference_config()["asr"])
+
 @st.cache_resource
 def _get_core_services_cached(session_id):
-    print(f"\n🚀 [SYSTEM] KHỞI TẠO SERVICES CHO SESSION: {session_id}")
-    vad = VADDetector()
-    asr = OpenAIASRService(api_key=API_KEY)
+    logger.info(f"🚀 [SYSTEM] KHỞI TẠO SERVICES CHO SESSION: {session_id}")
+    infer_cfg = inference_config()
+    vad = VADDetector(**infer_cfg["vad"])
+    asr = _get_asr_service_cached()
     diarizer = OfflineDiarizer(hf_token=HF_TOKEN) if HF_TOKEN else None
     
     # PDF Service
@@ -63,7 +94,7 @@ def _get_core_services_cached(session_id):
     # RAG Service
     rag_gen = MeetingMinuteGenerator(api_key=API_KEY)
     
-    restore_punctuation("", force_flush=False)
+    get_punctuation_restorer(**infer_cfg["punctuation"])
     return vad, asr, diarizer, pdf_kb, rag_gen
 
 def load_core_services():
@@ -73,30 +104,94 @@ def load_core_services():
 
 vad_model, asr_model, diarizer_model, pdf_service, rag_service = load_core_services()
 
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+job_queue = get_job_queue()
+
 # --- 2. STATE MANAGEMENT ---
-if "transcript_history" not in st.session_state: st.session_state.transcript_history = ""
-if "full_transcript" not in st.session_state: st.session_state.full_transcript = [] 
+TRANSCRIPT_PAGE_SIZE = 50 # Số câu hiển thị mỗi trang khi render lại transcript
+
+if "transcript" not in st.session_state: st.session_state.transcript = TranscriptStore()
 if "pdf_processed" not in st.session_state: st.session_state.pdf_processed = False
 if "pdf_name" not in st.session_state: st.session_state.pdf_name = ""
+def reattach_jobs():
+    """
+    Lần chạy đầu của phiên (vd: sau khi tải lại trang): theo dõi tiếp các job nền còn đang
+    chờ/chạy của phiên và khôi phục kết quả các job đã xong, thay vì để người dùng gửi job mới.
+    """
+    owner = st.session_state.session_id
+    pdf_job = job_queue.latest(owner, "ingest_pdf")
+    if pdf_job:
+        st.session_state.pdf_name = pdf_job["payload"].get("pdf_name", "")
+        if pdf_job["status"] == DONE:
+            st.session_state.pdf_processed = True
+        elif pdf_job["status"] in (QUEUED, RUNNING):
+            st.session_state.pdf_job_id = pdf_job["id"]
+
+    audio_job = job_queue.latest(owner, "transcribe")
+    if audio_job and audio_job["status"] in (QUEUED, RUNNING):
+        st.session_state.audio_bg_job = audio_job["id"]
+    elif audio_job and audio_job["status"] == DONE and not st.session_state.transcript.entries:
+        for entry in audio_job["result"]["entries"]:
+            st.session_state.transcript.append(entry['text'], entry['speaker'])
+
+    minutes_job = job_queue.latest(owner, "minutes")
+    if minutes_job and minutes_job["status"] in (QUEUED, RUNNING):
+        st.session_state.minutes_job_id = minutes_job["id"]
+    elif minutes_job and minutes_job["status"] == DONE and not st.session_state.get("final_minutes"):
+        st.session_state.final_minutes = minutes_job["result"]["summary"]
+
+if "jobs_reattached" not in st.session_state:
+    st.session_state.jobs_reattached = True
+    reattach_jobs()
+
+# Buffer dấu câu riêng của phiên (dùng chung model đã tải), không đụng tới phiên khác
+if "punctuator" not in st.session_state: st.session_state.punctuator = get_punctuation_restorer().new_buffer()
+
+def wait_for_job(job_id, progress_bar, status_text, on_poll=None, interval=1.0):
+    """
+    UI chỉ poll trạng thái job (xử lý nặng chạy ở worker process) cho tới khi xong.
+    Tải lại trang không làm mất job; chỉ cần mở lại là tiếp tục theo dõi.
+    """
+    while True:
+        job = job_queue.status(job_id)
+        if on_poll:
+            on_poll(job)
+        progress_bar.progress(min(job['progress'] or 0.0, 1.0))
+        status_text.text(job['message'] or f"Trạng thái job: {job['status']}")
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(interval)
 
 def clear_session():
-    st.session_state.transcript_history = ""
-    st.session_state.full_transcript = []
+    st.session_state.transcript.clear()
     st.session_state.final_minutes = ""
-    restore_punctuation("", force_flush=True)
+    st.session_state.punctuator.flush()
     st.toast("Đã xóa dữ liệu cũ!", icon="🗑️")
 
 # --- 3. UI SIDEBAR (PDF FLOW) ---
 with st.sidebar:
+    use_jobs = st.toggle("⚙️ Xử lý nền (job queue)", value=USE_JOB_QUEUE,
+                         help="Gỡ băng file, vector hóa PDF và tạo biên bản chạy ở worker riêng (python -m core.jobs worker)")
+    
     st.header("1. Tài liệu (PDF)")
     uploaded_pdf = st.file_uploader("Upload PDF", type="pdf")
     
     # Xử lý PDF
     if uploaded_pdf:
         # Kiểm tra nếu file mới khác file cũ hoặc chưa process
-        if uploaded_pdf.name != st.session_state.pdf_name:
+        if uploaded_pdf.name != st.session_state.pdf_name and use_jobs:
+            st.session_state.pdf_job_id = job_queue.submit_upload("ingest_pdf", {
+                "pdf_name": uploaded_pdf.name,
+                "collection": f"meeting_{st.session_state.session_id}"
+            }, uploaded_pdf, uploaded_pdf.name, path_key="pdf_path", owner=st.session_state.session_id)
+            st.session_state.pdf_processed = False
+            st.session_state.pdf_name = uploaded_pdf.name
+        elif uploaded_pdf.name != st.session_state.pdf_name:
             st.info(f"🔄 Đang xử lý PDF: {uploaded_pdf.name}...")
-            print(f"\n📄 [PDF FLOW] Bắt đầu xử lý file: {uploaded_pdf.name}")
+            logger.info(f"📄 [PDF FLOW] Bắt đầu xử lý file: {uploaded_pdf.name}")
             
             pdf_path = f"temp_{st.session_state.session_id}.pdf"
             with open(pdf_path, "wb") as f:
@@ -110,7 +205,21 @@ with st.sidebar:
             st.session_state.pdf_name = uploaded_pdf.name
             
             if os.path.exists(pdf_path): os.remove(pdf_path)
-            print(f"✅ [PDF FLOW] Hoàn tất vector hóa PDF.\n")
+            logger.info("✅ [PDF FLOW] Hoàn tất vector hóa PDF.")
+    
+    # PDF đang được vector hóa ở worker
+    if st.session_state.get("pdf_job_id") and not st.session_state.pdf_processed:
+        pdf_job = job_queue.status(st.session_state.pdf_job_id)
+        if pdf_job['status'] == DONE:
+            st.session_state.pdf_processed = True
+            st.session_state.pdf_job_id = None
+        elif pdf_job['status'] == FAILED:
+            st.error(f"❌ Lỗi xử lý PDF: {pdf_job['error']}")
+            st.session_state.pdf_job_id = None
+        else:
+            st.info(f"⏳ Đang xử lý nền PDF: {st.session_state.pdf_name}...")
+            if st.button("🔄 Cập nhật trạng thái PDF"):
+                st.rerun()
     
     # Hiển thị trạng thái PDF
     if st.session_state.pdf_processed:
@@ -123,70 +232,123 @@ with st.sidebar:
         clear_session()
         st.rerun()
 
+    st.divider()
+    with st.expander("📊 Profiling phiên"):
+        session_metrics = st.session_state.metrics
+        rows = session_metrics.summary()
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Chưa có số liệu.")
+        col_refresh, col_export = st.columns(2)
+        if col_refresh.button("🔄 Làm mới"):
+            st.rerun()
+        col_export.download_button("⬇️ Prometheus", session_metrics.render_prometheus(),
+                                   file_name="metrics.txt", mime="text/plain")
+
 # --- 4. MAIN UI (AUDIO FLOW) ---
 tab1, tab2 = st.tabs(["🎙️ Real-time", "🎧 Upload File"])
 
 # Helper functions
-def add_to_transcript(text, speaker):
-    color = {"SPEAKER_00": "#00cc66", "SPEAKER_01": "#0099ff", "Người nói": "#999999"}.get(speaker, "#333333")
-    st.session_state.transcript_history += f"<div class='final-box' style='border-left-color: {color};'><b style='color:{color}'>{speaker}:</b> {text}</div>"
-    st.session_state.full_transcript.append({"speaker": speaker, "text": text})
-
-def process_chunk_logic(audio_chunk):
-    # 1. Diarization
-    speaker = "Người nói"
-    if diarizer_model:
-        try:
-            temp_wav = "temp_proc.wav"
-            sf.write(temp_wav, audio_chunk, 16000)
-            diar = diarizer_model.process_file(temp_wav)
-            # Dominant speaker logic
-            segs = diar.get("speaker_segments", [])
-            if segs:
-                durations = {}
-                for s in segs: durations[s['speaker']] = durations.get(s['speaker'], 0) + (s['end'] - s['start'])
-                speaker = max(durations, key=durations.get)
-            if os.path.exists(temp_wav): os.remove(temp_wav)
-        except: pass
-    
-    # 2. ASR
-    raw_text = ""
-    if asr_model:
-        res = asr_model.predict(audio_chunk)
-        raw_text = res.get('text', '').strip()
-    
-    # 3. Punctuation & Add
-    if raw_text:
-        punct = restore_punctuation(raw_text, force_flush=False)
-        if punct:
-            add_to_transcript(punct['punctuated_text'], speaker)
-        return raw_text # Trả về để biết có text hay không
-    return None
+def add_to_transcript(text, speaker, container=None):
+    entry = st.session_state.transcript.append(text, speaker)
+    # Chỉ đẩy câu mới lên UI (append-only), không render lại toàn bộ transcript
+    if container is not None:
+        container.markdown(entry_to_html(entry), unsafe_allow_html=True)
+
+def render_transcript(container, key):
+    """
+    Render lại transcript khi script rerun: chỉ hiển thị một trang
+    (mặc định trang cuối), các trang cũ chọn qua thanh phân trang.
+    """
+    store = st.session_state.transcript
+    num_pages = store.num_pages(TRANSCRIPT_PAGE_SIZE)
+    with container:
+        page_index = num_pages - 1
+        if num_pages > 1:
+            page_index = st.select_slider("Trang transcript", options=list(range(num_pages)),
+                                          value=num_pages - 1, format_func=lambda p: f"{p + 1}/{num_pages}",
+                                          key=key)
+        for entry in store.page(page_index, TRANSCRIPT_PAGE_SIZE):
+            st.markdown(entry_to_html(entry), unsafe_allow_html=True)
+
+def get_realtime_pipeline(audio_processor):
+    """
+    Mỗi phiên WebRTC (mỗi audio_processor) có một pipeline nền riêng,
+    lưu trong session_state để không bị khởi tạo lại sau mỗi lần rerun.
+    Pipeline tự dừng khi kết nối WebRTC đóng (on_ended) hoặc khi audio_processor
+    bị thu hồi (phiên kết thúc mà script không chạy lại), nên không để lại thread mồ côi.
+    """
+    pipeline = st.session_state.get("rt_pipeline")
+    if pipeline is not None and pipeline.source_queue is not audio_processor.output_queue:
+        pipeline.stop()
+        pipeline = None
+    if pipeline is None:
+        punctuator = st.session_state.punctuator
+        pipeline = RealtimePipeline(audio_processor.output_queue, asr_model, diarizer_model,
+                                    punctuate=punctuator.restore, pending_text=punctuator.pending_text,
+                                    interim_queue=audio_processor.interim_queue,
+                                    registry=st.session_state.metrics).start()
+        audio_processor.add_on_ended(pipeline.stop)
+        weakref.finalize(audio_processor, pipeline.stop)
+        st.session_state.rt_pipeline = pipeline
+    return pipeline
+
+def stop_realtime_pipeline():
+    pipeline = st.session_state.pop("rt_pipeline", None)
+    if pipeline is not None:
+        pipeline.stop()
 
 # --- TAB 1: REAL-TIME ---
 with tab1:
     col_l, col_r = st.columns([1, 2])
     with col_l:
-        def factory(): return RealTimeAudioProcessor(vad_model=vad_model)
+        session_metrics = st.session_state.metrics
+        def factory(): return RealTimeAudioProcessor(vad_model=vad_model, registry=session_metrics)
         ctx = webrtc_streamer(key="rec", mode=WebRtcMode.SENDONLY, audio_processor_factory=factory,
                               rtc_configuration={"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]})
     with col_r:
         chat_box = st.container()
+        draft_box = st.empty()
         status_txt = st.empty()
-        with chat_box: st.markdown(st.session_state.transcript_history, unsafe_allow_html=True)
+        render_transcript(chat_box, key="page_realtime")
         
-        if ctx.state.playing:
-            while True:
-                if ctx.audio_processor:
-                    try:
-                        chunk = ctx.audio_processor.output_queue.get_nowait()
-                        status_txt.info("⚡ Đang xử lý...")
-                        res = process_chunk_logic(chunk)
-                        if res: 
-                            with chat_box: st.markdown(st.session_state.transcript_history, unsafe_allow_html=True)
-                            status_txt.empty()
-                    except queue.Empty:
-                        time.sleep(0.1)
+        if ctx.state.playing and ctx.audio_processor:
+            # Xử lý nặng chạy trên các thread nền, UI chỉ đọc kết quả
+            pipeline = get_realtime_pipeline(ctx.audio_processor)
+            pending_text, interim_text = "", ""
+            last_final_segment = -1
+            while pipeline.running:
+                result = pipeline.get_result(timeout=0.1)
+                if result:
+                    if result['type'] == "final":
+                        last_final_segment = result['segment_id']
+                        if result['text']:
+                            add_to_transcript(result['text'], result['speaker'], container=chat_box)
+                        pending_text, interim_text = result['pending_text'], ""
+                    elif result['segment_id'] > last_final_segment:
+                        interim_text = result['text']
+                    
+                    # Bản nháp = text chờ thêm dấu câu + câu đang nói
+                    draft = " ".join(t for t in (pending_text, interim_text) if t)
+                    if draft:
+                        draft_box.markdown(f"<div class='draft-box'>✍️ {html.escape(draft)}</div>", unsafe_allow_html=True)
+                    else:
+                        draft_box.empty()
+                processor = ctx.audio_processor
+                backlog = processor.backlog
+                if processor.dropped_segments:
+                    status_txt.warning(f"⚠️ Xử lý không theo kịp: {backlog} đoạn chờ, "
+                                       f"đã bỏ {processor.dropped_segments} đoạn")
+                elif pipeline.in_flight > 0 or backlog > 0:
+                    status_txt.info(f"⚡ Đang xử lý {pipeline.in_flight} đoạn, {backlog} đoạn chờ...")
+                else:
+                    status_txt.empty()
+            # Kết nối đã đóng, pipeline đã tự dừng qua on_ended
+            draft_box.empty()
+            status_txt.empty()
+        else:
+            stop_realtime_pipeline()
 
 # ================= TAB 2: UPLOAD AUDIO FILE (SỬA LẠI) =================
 with tab2:
@@ -195,155 +357,141 @@ with tab2:
     
     if audio_file:
         st.audio(audio_file)
-        if st.button("🚀 Bắt đầu xử lý File"):
+        
+        # Checkpoint theo nội dung file: rerun / mất kết nối / lỗi API đều xử lý tiếp được
+        # (hash nội dung chỉ tính lại khi đổi file)
+        audio_key = (audio_file.name, audio_file.size)
+        if st.session_state.get("audio_key") != audio_key:
+            st.session_state.audio_key = audio_key
+            st.session_state.audio_job_id = JobCheckpoint.job_id_for(audio_file)
+        checkpoint = JobCheckpoint(st.session_state.audio_job_id)
+        if checkpoint.completed:
+            st.success(f"✅ File này đã được xử lý xong trước đó ({len(checkpoint.segments)} đoạn). "
+                       "Tải kết quả đã lưu, hoặc xử lý lại từ đầu.")
+        elif checkpoint.exists():
+            st.caption(f"📌 File này đã có {len(checkpoint.segments)} đoạn được xử lý (chưa xong).")
+        if checkpoint.exists():
+            col_load, col_reset = st.columns(2)
+            if col_load.button("📂 Tải transcript đã lưu"):
+                clear_session()
+                for entry in checkpoint.entries():
+                    st.session_state.transcript.append(entry['text'], entry['speaker'])
+                st.rerun()
+            if col_reset.button("🔁 Xử lý lại từ đầu", disabled=bool(st.session_state.get("audio_bg_job"))):
+                checkpoint.reset()
+                st.rerun()
+        
+        process_label = "▶️ Xử lý tiếp File" if checkpoint.exists() else "🚀 Bắt đầu xử lý File"
+        if use_jobs:
+            # Gửi job cho worker; file cùng nội dung sẽ gắn lại vào job đang chạy
+            if not checkpoint.completed and st.button(process_label,
+                                                      disabled=bool(st.session_state.get("audio_bg_job"))):
+                st.session_state.audio_bg_job = job_queue.submit_upload(
+                    "transcribe", {"checkpoint_id": checkpoint.job_id}, audio_file, audio_file.name,
+                    path_key="audio_path", dedupe_key=checkpoint.job_id, owner=st.session_state.session_id
+                )
+        
+        elif not checkpoint.completed and st.button(process_label):
             # Clear data cũ
             clear_session()
-            print(f"\n🎧 [AUDIO FLOW] Bắt đầu xử lý file audio: {audio_file.name}")
+            logger.info(f"🎧 [AUDIO FLOW] Bắt đầu xử lý file audio: {audio_file.name}")
+            
+            status_bar = st.progress(0)
+            status_text = st.empty()
+            chat_box_file = st.container()
+            
+            # Hiển thị lại phần đã xử lý từ checkpoint (không gọi lại API)
+            for entry in checkpoint.entries():
+                add_to_transcript(entry['text'], entry['speaker'], container=chat_box_file)
             
             with st.spinner("Đang tải và phân tích file..."):
-                # 1. Load file
-                y, sr = librosa.load(audio_file, sr=16000)
-                
-                # 2. Smart Splitting (Cắt bỏ khoảng lặng)
-                # top_db=25: Các âm thanh nhỏ hơn 25dB so với peak sẽ bị coi là im lặng
-                # frame_length, hop_length: Cấu hình cửa sổ quét
-                non_silent_intervals = librosa.effects.split(y, top_db=25, frame_length=2048, hop_length=512)
-                
-                total_segments = len(non_silent_intervals)
-                print(f"✂️ Đã cắt thành {total_segments} đoạn hội thoại (bỏ qua khoảng lặng).")
-                
-                status_bar = st.progress(0)
-                status_text = st.empty()
-                chat_box_file = st.container()
-                
-                # Biến lưu context để gửi cho Whisper (giúp nối từ tốt hơn)
-                previous_context = ""
+                # 1. Giải mã dần theo khối (streaming), không load cả file vào RAM
+                sr = 16000
+                total_duration = probe_duration(audio_file)
+                audio_file.seek(0)
                 
-                # 3. Duyệt qua từng đoạn hội thoại thực sự
-                for i, (start, end) in enumerate(non_silent_intervals):
-                    # Lấy đoạn audio
-                    chunk = y[start:end]
-                    
-                    # Nếu đoạn quá ngắn (< 0.5s) thì bỏ qua
-                    duration = (end - start) / sr
-                    if duration < 0.5:
-                        continue
+                # 2. Smart Splitting -> Diarization -> ASR (kèm ngữ cảnh) -> Dấu câu,
+                # mỗi đoạn xong được ghi ngay vào checkpoint
+                try:
+                    for record in transcribe_file(audio_file, asr_model, diarizer_model, checkpoint=checkpoint, sample_rate=sr):
+                        if record['entry']:
+                            add_to_transcript(record['entry']['text'], record['entry']['speaker'], container=chat_box_file)
+                        if record['type'] != "segment":
+                            continue
                         
-                    # Hiển thị log
-                    status_text.text(f"Đang xử lý đoạn {i+1}/{total_segments} ({duration:.1f}s)...")
-                    if i % 5 == 0: print(f"   ⏳ [AUDIO] Processing segment {i+1}/{total_segments}")
-                    
-                    # --- GỌI XỬ LÝ (SỬA LẠI LOGIC GỌI) ---
-                    # Logic tách ra để truyền previous_context vào
-                    
-                    # A. Diarization (Vẫn chạy như cũ)
-                    speaker = "Người nói"
-                    if diarizer_model:
-                        try:
-                            temp_wav = "temp_proc.wav"
-                            sf.write(temp_wav, chunk, 16000)
-                            diar = diarizer_model.process_file(temp_wav)
-                            segs = diar.get("speaker_segments", [])
-                            if segs:
-                                durations = {}
-                                for s in segs: durations[s['speaker']] = durations.get(s['speaker'], 0) + (s['end'] - s['start'])
-                                speaker = max(durations, key=durations.get)
-                            if os.path.exists(temp_wav): os.remove(temp_wav)
-                        except: pass
-                    
-                    # B. ASR (OpenAI) - TRUYỀN THÊM PREVIOUS CONTEXT
-                    raw_text = ""
-                    if asr_model:
-                        # Lưu ý: method predict cần update ở core/openai_asr.py để nhận tham số thứ 2
-                        res = asr_model.predict(chunk, previous_text=previous_context)
-                        raw_text = res.get('text', '').strip()
-                    
-                    # C. Update UI & Context
-                    if raw_text:
-                        # Cập nhật context cho vòng lặp sau
-                        previous_context = raw_text 
+                        # Hiển thị log
+                        i, end = record['index'], record['end']
+                        position = f"{end / sr:.0f}s/{total_duration:.0f}s" if total_duration else f"{end / sr:.0f}s"
+                        status_text.text(f"Đã xử lý đoạn {i+1} - {position}...")
+                        if i % 5 == 0: logger.info(f"⏳ [AUDIO] Processing segment {i+1} ({position})")
                         
-                        punct = restore_punctuation(raw_text, force_flush=False)
-                        if punct:
-                            add_to_transcript(punct['punctuated_text'], speaker)
-                            with chat_box_file: 
-                                st.markdown(st.session_state.transcript_history, unsafe_allow_html=True)
-                    
-                    # Update Progress
-                    status_bar.progress((i + 1) / total_segments)
+                        # Update Progress (theo vị trí thời gian vì không biết trước số đoạn)
+                        if total_duration:
+                            status_bar.progress(min(end / sr / total_duration, 1.0))
+                except ASRRequestError as e:
+                    st.error(f"❌ Lỗi gọi ASR: {e}. Bấm xử lý lại để tiếp tục từ đoạn cuối cùng đã lưu.")
+                    st.stop()
             
-            # Flush cuối cùng
-            flush = restore_punctuation("", force_flush=True)
-            if flush:
-                add_to_transcript(flush['punctuated_text'], "End")
-                
+            status_bar.progress(1.0)
+            st.success("✅ Đã xử lý xong File!")
+    
+    # Job gỡ băng nền của phiên (kể cả job được gắn lại sau khi tải lại trang)
+    bg_job_id = st.session_state.get("audio_bg_job")
+    if bg_job_id:
+        st.session_state.transcript.clear()
+        status_bar = st.progress(0)
+        status_text = st.empty()
+        chat_box_file = st.container()
+        live_checkpoint = JobCheckpoint(job_queue.status(bg_job_id)["payload"]["checkpoint_id"])
+        
+        def show_new_entries(job):
+            # Chỉ đọc và render các đoạn mới được worker ghi vào checkpoint
+            for record in live_checkpoint.refresh():
+                if record.get('entry'):
+                    add_to_transcript(record['entry']['text'], record['entry']['speaker'], container=chat_box_file)
+        
+        job = wait_for_job(bg_job_id, status_bar, status_text, on_poll=show_new_entries)
+        st.session_state.audio_bg_job = None
+        if job['status'] == FAILED:
+            st.error(f"❌ Job lỗi: {job['error']}. Bấm xử lý lại để tiếp tục từ đoạn cuối cùng đã lưu.")
+        else:
             st.success("✅ Đã xử lý xong File!")
-            with chat_box_file:
-                st.markdown(st.session_state.transcript_history, unsafe_allow_html=True)
 
 # --- 5. RAG GENERATION (LOGIC GHÉP NỐI) ---
 st.divider()
 st.subheader("📝 Tạo biên bản & RAG Log")
 
-if st.button("🤖 Tạo Biên bản thông minh"):
-    if not st.session_state.full_transcript:
+if st.button("🤖 Tạo Biên bản thông minh", disabled=bool(st.session_state.get("minutes_job_id"))):
+    if not st.session_state.transcript.entries:
         st.warning("Chưa có nội dung hội thoại!")
+    elif use_jobs:
+        collection = f"meeting_{st.session_state.session_id}" if st.session_state.pdf_processed else None
+        # Mỗi phiên chỉ có một job biên bản đang chạy; bấm lại sẽ gắn vào job cũ
+        st.session_state.minutes_job_id = job_queue.submit("minutes", {
+            "entries": st.session_state.transcript.entries,
+            "collection": collection
+        }, dedupe_key=f"minutes_{st.session_state.session_id}", owner=st.session_state.session_id)
     else:
-        print("\n==================================================")
-        print("🤖 [RAG START] BẮT ĐẦU QUY TRÌNH TẠO BIÊN BẢN")
-        print(f"📊 Tổng số câu hội thoại: {len(st.session_state.full_transcript)}")
-        print(f"📚 Trạng thái PDF: {'Đã có' if st.session_state.pdf_processed else 'Không có'}")
-        print("==================================================\n")
-
-        full_summary = ""
-        
-        # 1. Convert transcript to text lines
-        raw_lines = [f"{x['speaker']}: {x['text']}" for x in st.session_state.full_transcript]
-        
-        # 2. Chunking Transcript (Gom 10 câu làm 1 chunk để query)
-        chunk_size = 10
-        trans_chunks = ["\n".join(raw_lines[i:i+chunk_size]) for i in range(0, len(raw_lines), chunk_size)]
-        
         rag_progress = st.progress(0)
-        
-        for idx, t_chunk in enumerate(trans_chunks):
-            print(f"\n--- 🔄 [CHUNK {idx+1}/{len(trans_chunks)}] XỬ LÝ ĐOẠN HỘI THOẠI ---")
-            print(f"📝 Nội dung chunk (rút gọn): {t_chunk[:100].replace(chr(10), ' ')}...")
-            
-            # 3. Retrieval (Tìm kiếm PDF)
-            relevant_pages = []
-            if st.session_state.pdf_processed:
-                print(f"🔎 [RETRIEVAL] Đang tìm kiếm trong ChromaDB...")
-                relevant_pages = pdf_service.find_relevant_pages(t_chunk)
-                
-                if relevant_pages:
-                    print(f"✅ [FOUND] Tìm thấy {len(relevant_pages)} ngữ cảnh liên quan:")
-                    for p in relevant_pages:
-                        print(f"    - [Trang {p['page']}]: {p['text'][:80]}...")
-                else:
-                    print("⚠️ [NOT FOUND] Không tìm thấy thông tin khớp trong PDF.")
-            else:
-                print("⏭️ [SKIP] Không có PDF, bỏ qua bước Retrieval.")
-
-            # 4. Generation (Gọi LLM)
-            print(f"🧠 [LLM] Đang gửi prompt tới OpenAI...")
-            res = rag_service.generate_minute_with_rag(t_chunk, relevant_pages)
-            print(f"✅ [DONE] LLM đã trả về tóm tắt cho chunk này.")
-            
-            # 5. Ghép kết quả
-            full_summary += f"\n#### Phần {idx+1}\n{res['summary']}\n"
-            if res['ref_pages']:
-                full_summary += f"*(Nguồn tham khảo: Trang {res['ref_pages']})*\n"
-            
-            rag_progress.progress((idx+1)/len(trans_chunks))
-        
-        print("\n==================================================")
-        print("✅ [RAG FINISH] ĐÃ TẠO XONG BIÊN BẢN")
-        print("==================================================\n")
+        pdf_kb = pdf_service if st.session_state.pdf_processed else None
+        full_summary = rag_service.generate_minutes(
+            st.session_state.transcript.entries, pdf_kb=pdf_kb,
+            progress_callback=lambda done, total: rag_progress.progress(done / total)
+        )
         
         st.session_state.final_minutes = full_summary
         st.success("Đã tạo biên bản xong! Kiểm tra Terminal để xem chi tiết log.")
 
+# Job biên bản nền của phiên (kể cả job được gắn lại sau khi tải lại trang)
+if st.session_state.get("minutes_job_id"):
+    job = wait_for_job(st.session_state.minutes_job_id, st.progress(0), st.empty())
+    st.session_state.minutes_job_id = None
+    if job['status'] == DONE:
+        st.session_state.final_minutes = job['result']['summary']
+        st.success("Đã tạo biên bản xong!")
+    else:
+        st.error(f"❌ Lỗi tạo biên bản: {job['error']}")
+
 if "final_minutes" in st.session_state and st.session_state.final_minutes:
     st.markdown("---")
     st.markdown("### 📋 KẾT QUẢ BIÊN BẢN")
@@ -0,0 +1,109 @@
+import json
+
+from core.checkpoint import JobCheckpoint
+
+
+def _segment(index, end, text="xin chào", ref_power=None):
+    return {"type": "segment", "index": index, "start": end - 16000, "end": end, "speaker": "A",
+            "raw_text": text, "prompt_context": "", "entry": None, "pending_text": text,
+            "ref_power": ref_power}
+
+
+def test_resume_state_of_empty_checkpoint(tmp_path):
+    state = JobCheckpoint("job", directory=str(tmp_path)).resume_state()
+    assert state == {"start_sample": 0, "next_index": 0, "prompt_context": "", "pending_text": "",
+                     "ref_power": None}
+
+
+def test_resume_state_continues_from_last_segment(tmp_path):
+    checkpoint = JobCheckpoint("job", directory=str(tmp_path))
+    checkpoint.append(_segment(0, 16000))
+    checkpoint.append(_segment(1, 48000, text="cuộc họp", ref_power=0.25))
+
+    state = JobCheckpoint("job", directory=str(tmp_path)).resume_state()
+    assert state["start_sample"] == 48000
+    assert state["next_index"] == 2
+    assert state["prompt_context"] == "cuộc họp"
+    assert state["ref_power"] == 0.25
+
+
+def test_resume_state_of_old_checkpoint_without_ref_power(tmp_path):
+    checkpoint = JobCheckpoint("job", directory=str(tmp_path))
+    record = _segment(0, 16000)
+    del record["ref_power"]
+    checkpoint.append(record)
+    assert JobCheckpoint("job", directory=str(tmp_path)).resume_state()["ref_power"] is None
+
+
+def test_partial_last_line_is_ignored_then_truncated(tmp_path):
+    checkpoint = JobCheckpoint("job", directory=str(tmp_path))
+    checkpoint.append(_segment(0, 16000))
+    # Process trước bị kill giữa lúc ghi dòng thứ hai
+    with open(checkpoint.path, "ab") as f:
+        f.write(b'{"type": "segment", "index": 1, "st')
+
+    resumed = JobCheckpoint("job", directory=str(tmp_path))
+    assert [r["index"] for r in resumed.segments] == [0]
+    resumed.append(_segment(1, 32000))
+
+    with open(checkpoint.path, "rb") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1]
+    assert [r["index"] for r in JobCheckpoint("job", directory=str(tmp_path)).segments] == [0, 1]
+
+
+def test_corrupt_complete_line_is_skipped(tmp_path):
+    checkpoint = JobCheckpoint("job", directory=str(tmp_path))
+    checkpoint.append(_segment(0, 16000))
+    with open(checkpoint.path, "ab") as f:
+        f.write(b"not json\n")
+    checkpoint.append(_segment(1, 32000))
+    assert [r["index"] for r in JobCheckpoint("job", directory=str(tmp_path)).segments] == [0, 1]
+
+
+def test_refresh_reads_only_new_records(tmp_path):
+    reader = JobCheckpoint("job", directory=str(tmp_path))
+    assert reader.refresh() == []
+
+    writer = JobCheckpoint("job", directory=str(tmp_path))
+    writer.append(_segment(0, 16000))
+    assert [r["index"] for r in reader.refresh()] == [0]
+    assert reader.refresh() == []
+
+    writer.append(_segment(1, 32000))
+    writer.append({"type": "done", "entry": None})
+    assert [r["type"] for r in reader.refresh()] == ["segment", "done"]
+    assert reader.completed
+    assert len(reader.records) == 3
+    # Record do chính writer ghi không bị đọc lại lần nữa
+    assert writer.refresh() == []
+    assert len(writer.records) == 3
+
+
+def test_refresh_waits_for_line_being_written(tmp_path):
+    reader = JobCheckpoint("job", directory=str(tmp_path))
+    reader.records
+    line = json.dumps(_segment(0, 16000)).encode("utf-8")
+    with open(reader.path, "ab") as f:
+        f.write(line[:10])
+    assert reader.refresh() == []
+    with open(reader.path, "ab") as f:
+        f.write(line[10:] + b"\n")
+    assert [r["index"] for r in reader.refresh()] == [0]
+
+
+def test_entries_and_reset(tmp_path):
+    checkpoint = JobCheckpoint("job", directory=str(tmp_path))
+    record = _segment(0, 16000)
+    record["entry"] = {"speaker": "A", "text": "Xin chào."}
+    checkpoint.append(record)
+    checkpoint.append(_segment(1, 32000))
+    checkpoint.save_speakers([{"start": 0.0, "end": 2.0, "speaker": "A"}])
+    assert checkpoint.entries() == [{"speaker": "A", "text": "Xin chào."}]
+    assert checkpoint.load_speakers() == [{"start": 0.0, "end": 2.0, "speaker": "A"}]
+
+    checkpoint.reset()
+    assert not checkpoint.exists()
+    assert checkpoint.load_speakers() is None
+    fresh = JobCheckpoint("job", directory=str(tmp_path))
+    assert not fresh.exists()
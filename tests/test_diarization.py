@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("torchaudio")
+pytest.importorskip("pyannote.audio")
+
+from core.diarization import _match_by_overlap, _stitch_windows
+
+# Cửa sổ 30s, chồng lấn 10s: cửa sổ 0 là [0, 30], cửa sổ 1 là [20, 50]
+E1, E2 = [1.0, 0.0, 0.1], [0.0, 1.0, 0.1]
+
+
+def _window(offset, segments, embeddings=None, duration=30.0):
+    return {"offset": offset, "duration": duration,
+            "segments": [{"speaker": s, "start": a, "end": b} for s, a, b in segments],
+            "embeddings": embeddings or {}}
+
+
+def _stitch(results, total_duration=50.0):
+    return _stitch_windows(results, window_seconds=30.0, overlap_seconds=10.0,
+                           total_duration=total_duration, similarity_threshold=0.6)
+
+
+def test_local_labels_are_mapped_by_embedding():
+    results = [
+        _window(0.0, [("A", 0.0, 12.0), ("B", 12.0, 30.0)], {"A": E1, "B": E2}),
+        # Pyannote đánh nhãn cục bộ lại từ đầu: SPEAKER_00 ở cửa sổ này là B của cửa sổ trước
+        _window(20.0, [("SPEAKER_00", 20.0, 35.0), ("SPEAKER_01", 35.0, 50.0)],
+                {"SPEAKER_00": [0.05, 0.9, 0.1], "SPEAKER_01": [0.95, 0.1, 0.1]}),
+    ]
+    assert _stitch(results) == [
+        {"speaker": "SPEAKER_01", "start": 0.0, "end": 12.0},
+        {"speaker": "SPEAKER_00", "start": 12.0, "end": 35.0},
+        {"speaker": "SPEAKER_01", "start": 35.0, "end": 50.0},
+    ]
+
+
+def test_windows_without_embeddings_are_mapped_by_overlap():
+    results = [
+        _window(0.0, [("A", 0.0, 12.0), ("B", 12.0, 30.0)]),
+        _window(20.0, [("X", 20.0, 35.0), ("Y", 36.0, 50.0)]),
+    ]
+    assert _stitch(results) == [
+        {"speaker": "SPEAKER_01", "start": 0.0, "end": 12.0},
+        {"speaker": "SPEAKER_00", "start": 12.0, "end": 35.0},
+        {"speaker": "SPEAKER_02", "start": 36.0, "end": 50.0},
+    ]
+
+
+def test_two_local_speakers_never_share_a_global_label():
+    results = [
+        _window(0.0, [("A", 0.0, 30.0)], {"A": E1}),
+        _window(20.0, [("P", 20.0, 40.0), ("Q", 41.0, 50.0)], {"P": E1, "Q": [0.9, 0.1, 0.1]}),
+    ]
+    speakers = [s["speaker"] for s in _stitch(results)]
+    assert speakers == ["SPEAKER_00", "SPEAKER_01"]
+
+
+def test_segments_are_clipped_to_total_duration():
+    results = [_window(0.0, [("A", 0.0, 30.0)], {"A": E1})]
+    assert _stitch(results, total_duration=27.5) == [{"speaker": "SPEAKER_00", "start": 0.0, "end": 27.5}]
+
+
+def test_match_by_overlap_requires_min_ratio():
+    previous = [{"global": 0, "start": 20.0, "end": 23.0}, {"global": 1, "start": 23.0, "end": 30.0}]
+    res = _window(20.0, [("X", 20.0, 30.0)])
+    assert _match_by_overlap("X", res, previous, 30.0, used=set()) == 1
+    # Người nói toàn cục 1 đã được gán cho người khác trong cửa sổ này
+    assert _match_by_overlap("X", res, previous, 30.0, used={1}) is None
+    assert _match_by_overlap("X", res, [], 30.0, used=set()) is None
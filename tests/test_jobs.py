@@ -0,0 +1,121 @@
+import io
+import os
+import time
+
+import pytest
+
+from core.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return JobQueue(db_path=str(tmp_path / "queue.db"), upload_dir=str(tmp_path / "uploads"), retry_delay=0)
+
+
+def test_claim_returns_oldest_queued_job_once(job_queue):
+    first = job_queue.submit("minutes", {"n": 1})
+    second = job_queue.submit("minutes", {"n": 2})
+
+    job = job_queue.claim("w1")
+    assert job["id"] == first
+    assert job["status"] == RUNNING
+    assert job["attempts"] == 1
+    assert job_queue.claim("w2")["id"] == second
+    assert job_queue.claim("w3") is None
+    assert job_queue.status(first)["worker"] == "w1"
+
+
+def test_claim_skips_jobs_waiting_for_retry(job_queue):
+    job_queue.retry_delay = 60
+    job_id = job_queue.submit("minutes", {})
+    job_queue.claim("w1")
+    assert job_queue.fail(job_id, "boom") is False
+    assert job_queue.status(job_id)["status"] == QUEUED
+    assert job_queue.claim("w1") is None
+
+
+def test_submit_dedupes_active_jobs_only(job_queue):
+    job_id = job_queue.submit("transcribe", {}, dedupe_key="abc")
+    assert job_queue.submit("transcribe", {}, dedupe_key="abc") == job_id
+    # Khác kind thì không trùng
+    assert job_queue.submit("minutes", {}, dedupe_key="abc") != job_id
+
+    job_queue.claim("w1")
+    assert job_queue.submit("transcribe", {}, dedupe_key="abc") == job_id
+    job_queue.complete(job_id, {"ok": True})
+    assert job_queue.submit("transcribe", {}, dedupe_key="abc") != job_id
+
+
+def test_submit_upload_stores_file_only_for_new_job(job_queue):
+    job_id = job_queue.submit_upload("transcribe", {}, io.BytesIO(b"audio"), "a.wav", "audio_path", dedupe_key="a")
+    path = job_queue.status(job_id)["payload"]["audio_path"]
+    assert open(path, "rb").read() == b"audio"
+
+    again = job_queue.submit_upload("transcribe", {}, io.BytesIO(b"audio"), "a.wav", "audio_path", dedupe_key="a")
+    assert again == job_id
+    assert os.listdir(job_queue.upload_dir) == [os.path.basename(path)]
+
+
+def test_fail_retries_until_max_attempts(job_queue):
+    job_id = job_queue.submit("transcribe", {}, max_attempts=2)
+
+    job_queue.claim("w1")
+    assert job_queue.fail(job_id, "boom") is False
+    job = job_queue.status(job_id)
+    assert job["status"] == QUEUED
+    assert job["worker"] is None
+    assert "1/2" in job["message"]
+
+    assert job_queue.claim("w1")["attempts"] == 2
+    assert job_queue.fail(job_id, "boom") is True
+    job = job_queue.status(job_id)
+    assert job["status"] == FAILED
+    assert job["message"] == "Lỗi: boom"
+
+
+def test_fail_without_retry_is_terminal(job_queue):
+    job_id = job_queue.submit("transcribe", {})
+    job_queue.claim("w1")
+    assert job_queue.fail(job_id, "bad input", retry=False) is True
+    assert job_queue.status(job_id)["status"] == FAILED
+
+
+def test_requeue_stale_requeues_dead_jobs(job_queue):
+    job_id = job_queue.submit("transcribe", {})
+    job_queue.claim("w1")
+    assert job_queue.requeue_stale(timeout=60) == 0
+
+    with job_queue._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, job_id))
+    assert job_queue.requeue_stale(timeout=60) == 1
+    job = job_queue.status(job_id)
+    assert job["status"] == QUEUED
+    assert job["worker"] is None
+
+
+def test_requeue_stale_fails_exhausted_jobs_and_removes_uploads(job_queue):
+    job_id = job_queue.submit_upload("transcribe", {}, io.BytesIO(b"x"), "a.wav", "audio_path")
+    path = job_queue.status(job_id)["payload"]["audio_path"]
+    with job_queue._connect() as conn:
+        conn.execute("UPDATE jobs SET max_attempts = 1 WHERE id = ?", (job_id,))
+    job_queue.claim("w1")
+    with job_queue._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, job_id))
+
+    assert job_queue.requeue_stale(timeout=60) == 0
+    assert job_queue.status(job_id)["status"] == FAILED
+    assert not os.path.exists(path)
+
+
+def test_latest_returns_newest_job_of_owner(job_queue):
+    job_queue.submit("minutes", {"n": 1}, owner="s1")
+    newest = job_queue.submit("minutes", {"n": 2}, owner="s1")
+    job_queue.submit("minutes", {"n": 3}, owner="s2")
+    job_queue.submit("transcribe", {}, owner="s1")
+
+    assert job_queue.latest("s1", "minutes")["id"] == newest
+    assert job_queue.latest("s3", "minutes") is None
+    assert job_queue.status(newest)["status"] == QUEUED
+    job_queue.complete(newest, {"summary": "ok"})
+    assert job_queue.result(newest) == {"summary": "ok"}
+    assert job_queue.status(newest)["status"] == DONE
@@ -0,0 +1,81 @@
+from core import metrics
+from core.metrics import MetricsRegistry
+
+
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    registry.counter("asr_requests_total", backend="openai").inc()
+    registry.counter("asr_requests_total", backend="openai").inc(2)
+    registry.gauge("pipeline_queue_depth", queue="audio").set(3)
+
+    text = registry.render_prometheus()
+    assert "# HELP meeting_asr_requests_total Số request ASR, theo backend\n" in text
+    assert "# TYPE meeting_asr_requests_total counter\n" in text
+    assert 'meeting_asr_requests_total{backend="openai"} 3.0\n' in text
+    assert "# TYPE meeting_pipeline_queue_depth gauge\n" in text
+    assert 'meeting_pipeline_queue_depth{queue="audio"} 3\n' in text
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("asr_latency_seconds", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    lines = registry.render_prometheus().splitlines()
+    assert 'meeting_asr_latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'meeting_asr_latency_seconds_bucket{le="1"} 3' in lines
+    assert 'meeting_asr_latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "meeting_asr_latency_seconds_sum 2.65" in lines
+    assert "meeting_asr_latency_seconds_count 4" in lines
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", kind='a"b\\c\nd').inc()
+    assert 'meeting_jobs_total{kind="a\\"b\\\\c\\nd"} 1.0' in registry.render_prometheus()
+
+
+def test_session_registry_aggregates_into_parent():
+    parent = MetricsRegistry()
+    first = MetricsRegistry(parent=parent, session_id="s1")
+    second = MetricsRegistry(parent=parent, session_id="s2")
+    first.counter("segments_total", source="realtime").inc()
+    second.counter("segments_total", source="realtime").inc(2)
+    first.gauge("pipeline_queue_depth", queue="audio").set(1)
+    second.gauge("pipeline_queue_depth", queue="audio").set(5)
+
+    text = parent.render_prometheus()
+    assert 'meeting_segments_total{source="realtime"} 3.0' in text
+    assert 'meeting_pipeline_queue_depth{queue="audio",session="s1"} 1' in text
+    assert 'meeting_pipeline_queue_depth{queue="audio",session="s2"} 5' in text
+    assert 'meeting_segments_total{source="realtime"} 1.0' in first.render_prometheus()
+
+
+def test_release_gauges_removes_session_series():
+    parent = MetricsRegistry()
+    session = MetricsRegistry(parent=parent, session_id="s1")
+    session.gauge("pipeline_queue_depth", queue="audio").set(1)
+    session.counter("segments_total").inc()
+
+    session.release_gauges("pipeline_queue_depth")
+    session.release_gauges("pipeline_queue_depth")
+    assert "pipeline_queue_depth" not in parent.render_prometheus()
+    assert "pipeline_queue_depth" not in session.render_prometheus()
+    assert "meeting_segments_total 1.0" in parent.render_prometheus()
+
+
+def test_module_helpers_use_bound_registry():
+    registry = MetricsRegistry()
+    metrics.bind_registry(registry)
+    try:
+        metrics.inc("vad_frames_total", speech="true")
+        with metrics.span("punctuation_seconds"):
+            pass
+    finally:
+        metrics.bind_registry(None)
+    assert metrics.current_registry() is metrics.REGISTRY
+    rows = {row["metric"]: row for row in registry.summary()}
+    assert rows["vad_frames_total"]["count"] == 1
+    assert rows["punctuation_seconds"]["count"] == 1
+    assert rows["punctuation_seconds"]["unit"] == "ms"
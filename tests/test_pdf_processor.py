@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("pdfplumber")
+pytest.importorskip("chromadb")
+pytest.importorskip("openai")
+
+from core.pdf_processor import chunk_text, stale_chunk_ids
+
+
+def _words(n):
+    return " ".join(f"w{i}" for i in range(n))
+
+
+def test_chunks_overlap_by_configured_tokens():
+    chunks = chunk_text(_words(10), chunk_size=4, chunk_overlap=1)
+    assert [c[0].split() for c in chunks] == [
+        ["w0", "w1", "w2", "w3"],
+        ["w3", "w4", "w5", "w6"],
+        ["w6", "w7", "w8", "w9"],
+    ]
+
+
+def test_offsets_point_into_original_text():
+    text = "  Điều 1.\n\nPhạm vi   áp dụng của quy định này  "
+    for chunk, start, end in chunk_text(text, chunk_size=3, chunk_overlap=1):
+        assert text[start:end] == chunk
+        assert chunk == chunk.strip()
+
+
+def test_last_window_is_not_pure_overlap():
+    chunks = chunk_text(_words(8), chunk_size=4, chunk_overlap=2)
+    assert chunks[-1][0].split() == ["w4", "w5", "w6", "w7"]
+    assert len(chunks) == 3
+
+
+def test_short_and_empty_text():
+    assert chunk_text("", chunk_size=4, chunk_overlap=1) == []
+    assert chunk_text("   \n ", chunk_size=4, chunk_overlap=1) == []
+    assert chunk_text("một hai", chunk_size=4, chunk_overlap=1) == [("một hai", 0, 7)]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(0, 0), (4, 4), (4, -1)])
+def test_invalid_settings(chunk_size, chunk_overlap):
+    with pytest.raises(ValueError):
+        chunk_text("a b c", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def test_stale_chunk_ids():
+    existing = ["doc_p1_c0", "doc_p1_c1", "doc_p2_c0", "doc_p3_c0"]
+    assert stale_chunk_ids(existing, ["doc_p1_c0", "doc_p2_c0"]) == ["doc_p1_c1", "doc_p3_c0"]
+    assert stale_chunk_ids(existing, existing) == []
+    assert stale_chunk_ids([], ["doc_p1_c0"]) == []